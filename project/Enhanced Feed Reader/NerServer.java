@@ -0,0 +1,106 @@
+/*
+ * Web 2.0 & Mobile Interaction -- Final Project
+ * December 4, 2009
+ *
+ * Olivier Jais-Nielsen (s090763)
+ * Andrea Lai (s091088)
+ *
+ * NerServer keeps one LingPipe demo (and therefore its model) loaded in a single JVM and answers framed
+ * requests on its standard input. It takes the same arguments as com.aliasi.demo.framework.DemoCommand,
+ * so lingpipe.py can start it with the java command line found in the cmd_ne_en_news_muc6 script.
+ *
+ * Request:  "<content type> <length>\n" followed by <length> bytes of input.
+ * Response: "OK <length>\n" or "ERR <length>\n" followed by <length> bytes of output (or error message).
+ */
+
+import com.aliasi.demo.framework.StreamDemo;
+
+import java.io.BufferedInputStream;
+import java.io.BufferedOutputStream;
+import java.io.ByteArrayInputStream;
+import java.io.ByteArrayOutputStream;
+import java.io.DataInputStream;
+import java.io.EOFException;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.IOException;
+import java.io.InputStream;
+import java.io.OutputStream;
+import java.lang.reflect.Constructor;
+import java.util.HashMap;
+import java.util.Map;
+
+public class NerServer {
+
+    public static void main(String[] args) throws Exception {
+        String constructorName = null;
+        String[] constructorArgs = new String[0];
+        Map<String,String> properties = new HashMap<String,String>();
+        for (String arg : args) {
+            int eq = arg.indexOf('=');
+            if (!arg.startsWith("-") || eq < 0)
+                continue;
+            String key = arg.substring(1, eq);
+            String value = arg.substring(eq + 1);
+            if (key.equals("demoConstructor"))
+                constructorName = value;
+            else if (key.equals("demoConstructorArgs"))
+                constructorArgs = value.split(",");
+            else
+                properties.put(key, value);
+        }
+        StreamDemo demo = createDemo(constructorName, constructorArgs);
+
+        // the demo must not write on the protocol stream
+        OutputStream out = new BufferedOutputStream(new FileOutputStream(FileDescriptor.out));
+        System.setOut(System.err);
+        DataInputStream in = new DataInputStream(new BufferedInputStream(System.in));
+
+        String header;
+        while ((header = readLine(in)) != null) {
+            int space = header.lastIndexOf(' ');
+            String contentType = header.substring(0, space);
+            byte[] input = new byte[Integer.parseInt(header.substring(space + 1))];
+            in.readFully(input);
+
+            Map<String,String> requestProperties = new HashMap<String,String>(properties);
+            requestProperties.put("contentType", contentType);
+            ByteArrayOutputStream output = new ByteArrayOutputStream();
+            String status = "OK";
+            try {
+                demo.process(new ByteArrayInputStream(input), output, requestProperties);
+            } catch (Exception e) {
+                status = "ERR";
+                output.reset();
+                output.write(String.valueOf(e).getBytes("UTF-8"));
+            }
+            out.write((status + " " + output.size() + "\n").getBytes("US-ASCII"));
+            output.writeTo(out);
+            out.flush();
+        }
+    }
+
+    static StreamDemo createDemo(String constructorName, String[] constructorArgs) throws Exception {
+        Class<?> demoClass = Class.forName(constructorName);
+        for (Constructor<?> constructor : demoClass.getConstructors()) {
+            if (constructor.getParameterTypes().length == constructorArgs.length)
+                return (StreamDemo) constructor.newInstance((Object[]) constructorArgs);
+        }
+        throw new IllegalArgumentException("No constructor of " + constructorName + " takes "
+                                           + constructorArgs.length + " arguments");
+    }
+
+    static String readLine(InputStream in) throws IOException {
+        StringBuilder line = new StringBuilder();
+        int c;
+        while ((c = in.read()) != '\n') {
+            if (c < 0) {
+                if (line.length() == 0)
+                    return null;
+                throw new EOFException("Truncated request header");
+            }
+            line.append((char) c);
+        }
+        return line.toString();
+    }
+}
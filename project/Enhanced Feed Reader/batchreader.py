@@ -0,0 +1,104 @@
+'''
+Web 2.0 & Mobile Interaction -- Final Project
+December 4, 2009
+
+Olivier Jais-Nielsen (s090763)
+Andrea Lai (s091088)
+
+The Enhanced Feed Reader uses latent semantic analysis to identify people, organizations, and places within an RSS feed and pull in relevant additional content (Google Maps, Google Search, and recent tweets) for display.
+
+
+batchreader.py ingests feeds without the GUI (e.g. from cron) and writes or merges the entries into an entity database file.
+
+usage: python batchreader.py [options] feed...
+where each feed is a URL or a local feed file.
+With -w, the feeds are added to the subscriptions kept next to the database and every subscription is polled until interrupted.
+'''
+
+import os
+import sys
+import time
+from optparse import OptionParser
+import infofinders
+from metrics import metrics
+from efrdb import EfrDb
+from lingpipe import LingPipeWarper
+from entrybuilder import EntryBuilder
+from pipeline import IngestionPipeline
+from feedcache import FeedCache
+from scheduler import FeedScheduler
+
+
+def printFeedStats(feedStats):
+    print feedStats
+    sys.stdout.flush()
+
+
+def main(argv):
+    parser = OptionParser(usage = "usage: %prog [options] feed...")
+    parser.add_option("-o", "--output", default = "efrdb.xml", help = "entity database to write, entries are merged into it if it exists [%default]")
+    parser.add_option("-l", "--lingpipe", default = "lingpipe-3.8.2", help = "LingPipe installation directory [%default]")
+    parser.add_option("-n", "--ner-workers", type = "int", default = 1, help = "number of LingPipe processes [%default]")
+    parser.add_option("-b", "--build-workers", type = "int", default = 8, help = "number of threads resolving and geocoding entities [%default]")
+    parser.add_option("-f", "--fetch-workers", type = "int", default = 4, help = "number of feeds fetched in parallel [%default]")
+    parser.add_option("-m", "--metrics", help = "file to write the timings and cache statistics to, as JSON if it ends with .json, else as text (- for the standard output)")
+    parser.add_option("-w", "--watch", action = "store_true", default = False, help = "keep polling the subscribed feeds instead of reading them once")
+    parser.add_option("-c", "--concurrent", type = "int", default = 4, help = "with -w, number of feeds being ingested at the same time [%default]")
+    parser.add_option("--min-interval", type = "int", default = 300, help = "with -w, shortest polling interval of a feed, in seconds [%default]")
+    parser.add_option("--max-interval", type = "int", default = 6 * 3600, help = "with -w, longest polling interval of a feed, in seconds [%default]")
+    (options, feeds) = parser.parse_args(argv)
+    subscriptionsPath = options.output + ".subscriptions"
+    if len(feeds) == 0 and not (options.watch and os.path.exists(subscriptionsPath)):
+        parser.error("no feed given")
+
+    efrDb = EfrDb()
+    if os.path.exists(options.output):
+        efrDb.load(options.output)
+    else:
+        efrDb.save(options.output)
+    initialSize = len(efrDb.getroot())
+
+    lingPipeWarpers = [LingPipeWarper(options.lingpipe, server = True) for i in range(options.ner_workers)]
+    # the state of the feeds is kept next to the database their entries went into
+    feedCache = FeedCache(options.output + ".feeds")
+    scheduler = None
+    onFeedDone = printFeedStats
+    if options.watch:
+        def onFeedDone(feedStats):
+            printFeedStats(feedStats)
+            scheduler.feedDone(feedStats)
+    pipeline = IngestionPipeline(EntryBuilder(), lingPipeWarpers, efrDb.append, None, onFeedDone, options.fetch_workers, options.build_workers, feedCache = feedCache, isKnown = efrDb.contains)
+    started = time.time()
+    if options.watch:
+        scheduler = FeedScheduler(pipeline, subscriptionsPath, options.min_interval, options.max_interval, maxConcurrent = options.concurrent)
+        for feed in feeds:
+            scheduler.subscribe(feed)
+        feeds = scheduler.subscriptions()
+        scheduler.start()
+        try:
+            while True:
+                time.sleep(60)
+                feedCache.save()
+        except KeyboardInterrupt:
+            scheduler.stop()
+    else:
+        for feed in feeds:
+            pipeline.submitFeed(feed)
+    pipeline.join()
+    for lingPipeWarper in lingPipeWarpers:
+        lingPipeWarper.close()
+
+    # the new entries are already in the journal, closing merges them into the snapshot
+    added = len(efrDb.getroot()) - initialSize
+    efrDb.close()
+    feedCache.save()
+    print "%d feeds, %d entries added to %s in %.2fs" % (len(feeds), added, options.output, time.time() - started)
+    print "%(calls)d lookups, %(deduplicated)d concurrent duplicates saved" % infofinders.flights.stats()
+    if options.metrics == "-":
+        print metrics.report()
+    elif not options.metrics == None:
+        metrics.save(options.metrics)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,459 @@
+'''
+Web 2.0 & Mobile Interaction -- Final Project
+December 4, 2009
+
+Olivier Jais-Nielsen (s090763)
+Andrea Lai (s091088)
+
+The Enhanced Feed Reader uses latent semantic analysis to identify people, organizations, and places within an RSS feed and pull in relevant additional content (Google Maps, Google Search, and recent tweets) for display.
+
+
+benchmark.py times the ingestion and analysis paths without LingPipe or network access.
+Synthetic feeds and entity databases are generated from the entities of a seed database (sample_entity_db_ccn.xml),
+the feeds, Wikipedia, Google and Twitter are served by a local HTTP server and LingPipe is replaced by a fake recognizer,
+each with a configurable latency. With the same options and seed, the same data is generated, so results can be compared across commits.
+Usage: python benchmark.py [options], e.g. python benchmark.py --entries 5000 --compare benchmark-1a2b3c4.json
+'''
+
+import os
+import re
+import sys
+import cgi
+import time
+import simplejson
+import random
+import shutil
+import bisect
+import urllib
+import urlparse
+import tempfile
+import threading
+import subprocess
+import BaseHTTPServer
+import SocketServer
+from optparse import OptionParser
+from lxml import etree
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+import infofinders
+from infofinders import loadXpathFunctions
+from cache import PersistentCache, ResponseCache, DAY
+from efrdb import EfrDb, SNAPSHOT_HEADER, SNAPSHOT_FOOTER
+from entrybuilder import EntryBuilder
+from pipeline import IngestionPipeline
+from renderer import PageRenderer
+from enrichment import EnrichmentLoader, enrichmentKeys
+from dbaccess import DbAccess
+from metrics import metrics
+
+BENCHMARKS = ["ingestion", "refresh", "enrichments", "getSimsWithEntity", "searchEntries", "displayLoc"]
+
+
+class Vocabulary:
+    """The entities of the synthetic data: those of the seed database, then numbered variants of them. Entities are drawn with Zipf-like frequencies."""
+
+    def __init__(self, seedPath, size, rng):
+        seed = []
+        for entity in etree.parse(seedPath).xpath("//entry/head/entity"):
+            entity = (entity.get("type"), entity.text, entity.get("coordinates", ""))
+            if not entity in seed:
+                seed.append(entity)
+        self.entities = []
+        for i in range(size):
+            (type, name, coordinates) = seed[i % len(seed)]
+            if i >= len(seed):
+                name = "%s %d" % (name, i // len(seed))
+                if type == "LOCATION":
+                    coordinates = "%.4f %.4f" % (rng.uniform(-60, 70), rng.uniform(-180, 180))
+            self.entities.append((type, name, coordinates))
+        self._cumulated = []
+        total = 0.
+        for i in range(size):
+            total += 1. / (i + 1)
+            self._cumulated.append(total)
+        self._rng = rng
+
+    def sample(self, count):
+        """returns count distinct entities"""
+        chosen = []
+        while len(chosen) < min(count, len(self.entities)):
+            entity = self.entities[bisect.bisect(self._cumulated, self._rng.random() * self._cumulated[-1])]
+            if not entity in chosen:
+                chosen.append(entity)
+        return chosen
+
+
+def writeDb(path, vocabulary, size, rng):
+    """writes an entity database of size entries, as EntryBuilder would have built them"""
+    output = open(path, "wb")
+    output.write(SNAPSHOT_HEADER)
+    for i in range(size):
+        entry = etree.Element("entry", title = "Synthetic entry %d" % i, link = "http://bench.example/db/%d" % i, date = "2009-12-03T03:42:24Z")
+        head = etree.SubElement(entry, "head")
+        body = etree.SubElement(entry, "body")
+        sentence = etree.SubElement(body, "span", {"class": "SENTENCE"})
+        sentence.text = "Report about "
+        for (type, name, coordinates) in vocabulary.sample(rng.randint(2, 8)):
+            entity = etree.SubElement(head, "entity", type = type)
+            if type == "LOCATION":
+                entity.set("coordinates", coordinates)
+            entity.text = name
+            mention = etree.SubElement(sentence, "span", {"class": "ENTITY " + type, "title": name})
+            mention.text = name
+            mention.tail = ", "
+        output.write(etree.tostring(entry, encoding = "UTF-8"))
+    output.write(SNAPSHOT_FOOTER)
+    output.close()
+
+def makeFeed(feedId, vocabulary, size, rng):
+    """returns an RSS document of size items mentioning entities of the vocabulary"""
+    items = []
+    for i in range(size):
+        names = [name for (type, name, coordinates) in vocabulary.sample(rng.randint(2, 8))]
+        text = "%s met %s. %s said nothing about %s." % (names[0], names[1], names[-1], ", ".join(names[2:-1]) or names[0])
+        items.append("<item><title>Synthetic story %d-%d</title><link>http://bench.example/feed/%d/%d</link><dc:date>2009-12-03T03:42:24Z</dc:date><description>%s</description></item>" % (feedId, i, feedId, i, cgi.escape(text)))
+    return "<?xml version=\"1.0\" encoding=\"UTF-8\"?><rss version=\"2.0\" xmlns:dc=\"http://purl.org/dc/elements/1.1/\"><channel><title>Feed %d</title>%s</channel></rss>" % (feedId, "".join(items))
+
+
+class FakeNer:
+    """Stands in for LingPipeWarper: tags the names of the vocabulary, after waiting latency per request and documentLatency per document"""
+
+    def __init__(self, vocabulary, latency, documentLatency):
+        names = sorted(set([cgi.escape(name) for (type, name, coordinates) in vocabulary.entities]), key = len, reverse = True)
+        self._types = dict([(cgi.escape(name), type) for (type, name, coordinates) in vocabulary.entities])
+        self._pattern = re.compile(r"(?<!\w)(%s)(?!\w)" % "|".join(map(re.escape, names)))
+        self._latency = latency
+        self._documentLatency = documentLatency
+
+    def _tag(self, input):
+        tagged = self._pattern.sub(lambda match: "<ENAMEX TYPE=\"%s\">%s</ENAMEX>" % (self._types[match.group(1)], match.group(1)), cgi.escape(input))
+        return "<output><s i=\"0\">%s</s></output>" % tagged
+
+    def parseNamedEntities(self, input, type):
+        time.sleep(self._latency + self._documentLatency)
+        return self._tag(input)
+
+    def parseNamedEntitiesBatch(self, inputs, type):
+        time.sleep(self._latency + self._documentLatency * len(inputs))
+        return [etree.fromstring(self._tag(input), etree.HTMLParser()) for input in inputs]
+
+    def close(self):
+        pass
+
+
+class FakeGeocoder:
+    """Stands in for the geocoder, answering after latency"""
+
+    def __init__(self, latency):
+        self._latency = latency
+
+    def geocode(self, name):
+        time.sleep(self._latency)
+        rng = random.Random(name)
+        return (name, (rng.uniform(-60, 70), rng.uniform(-180, 180)))
+
+
+class StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Serves the synthetic feeds and answers like Wikipedia search, Google AJAX search and Twitter search"""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, body, contentType):
+        time.sleep(self.server.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        (path, query) = urllib.splitquery(self.path)
+        query = urlparse.parse_qs(query or "")
+        if path.startswith("/feeds/"):
+            self._reply(self.server.feeds[path], "application/rss+xml")
+        elif path == "/search.json":
+            q = query.get("q", [""])[0]
+            tweets = [{"from_user": "user%d" % i, "text": cgi.escape("tweet %d about %s" % (i, q))} for i in range(3)]
+            self._reply(simplejson.dumps({"results": tweets}), "application/json")
+        elif path == "/ajax/services/search/web":
+            q = query.get("q", [""])[0]
+            results = [{"url": "http://bench.example/%d" % i, "titleNoFormatting": cgi.escape("%s result %d" % (q, i)), "content": "about"} for i in range(2)]
+            self._reply(simplejson.dumps({"responseData": {"results": results}}), "application/json")
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        name = urlparse.parse_qs(data).get("search", [""])[0]
+        self._reply("<html><head><title>%s - Wikipedia, the free encyclopedia</title></head><body><p>%s</p></body></html>" % (cgi.escape(name), cgi.escape(name)), "text/html")
+
+
+class StubServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """Serves in a background thread, each connection in a thread of its own. The handler threads are counted so that close can wait for them."""
+    daemon_threads = True
+
+    def __init__(self, latency):
+        BaseHTTPServer.HTTPServer.__init__(self, ("127.0.0.1", 0), StubHandler)
+        self.latency = latency
+        self.feeds = {}
+        self.url = "http://127.0.0.1:%d" % self.server_address[1]
+        self._handlers = 0
+        self._condition = threading.Condition()
+        thread = threading.Thread(target = self.serve_forever, name = "stub-server")
+        thread.setDaemon(True)
+        thread.start()
+
+    def process_request(self, request, clientAddress):
+        # counted here rather than in the new thread, so that none is missed once serve_forever has returned
+        self._condition.acquire()
+        self._handlers += 1
+        self._condition.release()
+        SocketServer.ThreadingMixIn.process_request(self, request, clientAddress)
+
+    def process_request_thread(self, request, clientAddress):
+        try:
+            SocketServer.ThreadingMixIn.process_request_thread(self, request, clientAddress)
+        finally:
+            self._condition.acquire()
+            self._handlers -= 1
+            self._condition.notifyAll()
+            self._condition.release()
+
+    def close(self, timeout = 5):
+        """stops serving and waits for the handler threads, which only end once the clients have closed their kept-alive connections"""
+        self.shutdown()
+        self.server_close()
+        deadline = time.time() + timeout
+        self._condition.acquire()
+        while self._handlers > 0 and time.time() < deadline:
+            self._condition.wait(deadline - time.time())
+        self._condition.release()
+
+
+def getFullUrl(context, input):
+    """replaces tools.getFullUrl, which needs Qt"""
+    return "file://" + urllib.pathname2url(os.path.join(HERE, input))
+
+def gitCommit():
+    """returns the current commit and whether the tracked files have been modified"""
+    try:
+        commit = subprocess.Popen(["git", "rev-parse", "HEAD"], cwd = HERE, stdout = subprocess.PIPE).communicate()[0].strip()
+        changes = subprocess.Popen(["git", "status", "--porcelain", "--untracked-files=no"], cwd = HERE, stdout = subprocess.PIPE).communicate()[0].strip()
+        return (commit or "unknown", not changes == "")
+    except OSError:
+        return ("unknown", False)
+
+def summarize(runs):
+    times = sorted([seconds for (seconds, details) in runs])
+    summary = {"runs": times, "min": times[0], "median": times[len(times) // 2], "mean": sum(times) / len(times)}
+    summary.update(runs[-1][1])
+    return summary
+
+
+class Benchmark:
+    """Generates the data, starts the stand-ins and runs the benchmarks, each repeat times from a cold state"""
+
+    def __init__(self, options):
+        self.options = options
+        self.workDir = tempfile.mkdtemp(prefix = "efrbench")
+        rng = random.Random(options.seed)
+        self.vocabulary = Vocabulary(options.seed_db, options.entities, rng)
+        self.dbPath = os.path.join(self.workDir, "db.xml")
+        writeDb(self.dbPath, self.vocabulary, options.entries, rng)
+        self.server = StubServer(options.web_latency)
+        self.feedUrls = []
+        for i in range(options.feeds):
+            self.server.feeds["/feeds/%d.xml" % i] = makeFeed(i, self.vocabulary, options.feed_entries, rng)
+            self.feedUrls.append("%s/feeds/%d.xml" % (self.server.url, i))
+        infofinders.WIKIPEDIA_SEARCH_URL = self.server.url + "/w/index.php"
+        infofinders.GOOGLE_SEARCH_URL = self.server.url + "/ajax/services/search/web"
+        infofinders.TWITTER_SEARCH_URL = self.server.url + "/search.json"
+        infofinders.WIKIPEDIA_INDEX = os.path.join(self.workDir, "none.idx")
+        infofinders.wikipediaIndex = None
+        infofinders.setGeocoder(FakeGeocoder(options.web_latency))
+        loadXpathFunctions([infofinders.getRealName, infofinders.getLocationCoordinates, infofinders.getMapUrl, infofinders.getGoogleSearch, infofinders.getTweets, getFullUrl], etree.FunctionNamespace('EnhancedFeedReader'))
+        self.efrDb = EfrDb()
+        self.efrDb.parse(self.dbPath)
+        self.builder = EntryBuilder(options.build_workers)
+        self._caches = 0
+
+    def coldCaches(self):
+        """replaces the resolver and response caches by empty ones"""
+        self._caches += 1
+        infofinders.resolverCache = PersistentCache(os.path.join(self.workDir, "cache%d.sqlite" % self._caches), {"realName": 30 * DAY, "coordinates": 180 * DAY})
+        infofinders.responseCache = ResponseCache()
+
+    def subjects(self, count, type = None):
+        """returns the count entities mentioned in most entries, of some type or of any"""
+        counts = {}
+        for entity in self.efrDb.xpath("/efrDb/entry/head/entity"):
+            if type == None or entity.get("type") == type:
+                key = (entity.text, entity.get("type"))
+                counts[key] = counts.get(key, 0) + 1
+        return [key for (n, key) in sorted([(-n, key) for (key, n) in counts.items()])[:count]]
+
+    def pages(self):
+        root = self.efrDb.getroot()
+        size = self.options.page_size
+        return [(start, root[start:start + size]) for start in range(0, min(len(root), size * self.options.pages), size)]
+
+    def ingestion(self):
+        self.coldCaches()
+        ners = [FakeNer(self.vocabulary, self.options.ner_latency, self.options.ner_document_latency) for i in range(self.options.ner_workers)]
+        entries = []
+        pipeline = IngestionPipeline(self.builder, ners, entries.append, buildWorkers = self.options.build_workers)
+        started = time.time()
+        for url in self.feedUrls:
+            pipeline.submitFeed(url)
+        pipeline.join()
+        elapsed = time.time() - started
+        return (elapsed, {"entries": len(entries), "entriesPerSecond": len(entries) / elapsed})
+
+    def refresh(self):
+        renderer = PageRenderer(os.path.join(HERE, "template.xsl"))
+        pages = self.pages()
+        started = time.time()
+        for (start, entries) in pages:
+            renderer.render(entries, start, self.efrDb.types, self.efrDb.withBodies)
+            enrichmentKeys(entries)
+        return (time.time() - started, {"pages": len(pages)})
+
+    def enrichments(self):
+        self.coldCaches()
+        keys = []
+        for (start, entries) in self.pages():
+            keys.extend([key for key in enrichmentKeys(entries) if not key in keys])
+        done = threading.Event()
+        loaded = []
+        def onResult(key, html):
+            loaded.append(key)
+            if len(loaded) == len(keys):
+                done.set()
+        loader = EnrichmentLoader(onResult)
+        started = time.time()
+        loader.request(keys)
+        if len(keys) > 0:
+            done.wait()
+        return (time.time() - started, {"enrichments": len(keys)})
+
+    def getSimsWithEntity(self):
+        dbAccess = DbAccess(self.efrDb)
+        axes = self.efrDb.types + ["coordinates"]
+        subjects = self.subjects(self.options.subjects)
+        started = time.time()
+        for (name, type) in subjects:
+            dbAccess.getSimsWithEntity(name, type, axes)
+        dbAccess.close()
+        return (time.time() - started, {"subjects": len(subjects)})
+
+    def searchEntries(self):
+        dbAccess = DbAccess(self.efrDb)
+        subjects = self.subjects(self.options.subjects)
+        queries = [[subject] for subject in subjects] + [list(pair) for pair in zip(subjects, subjects[1:])]
+        started = time.time()
+        found = 0
+        for query in queries:
+            found += len(dbAccess.searchEntries(query).getroot())
+        dbAccess.close()
+        return (time.time() - started, {"queries": len(queries), "entriesFound": found})
+
+    def displayLoc(self):
+        """DbBrowser.displayLoc without the display: the coordinates vector, and the map if PIL is installed"""
+        try:
+            from PIL import Image
+            import plotmap
+        except ImportError:
+            Image = None
+        dbAccess = DbAccess(self.efrDb)
+        subjects = self.subjects(self.options.subjects, "LOCATION")
+        started = time.time()
+        for (name, type) in subjects:
+            vector = dbAccess.getEntityVector(name, type, [], ["coordinates"])
+            if not Image == None and "coordinates" in vector:
+                from math import pi
+                im = Image.open(os.path.join(HERE, "map.jpg"))
+                coords = map(lambda (lat, long): plotmap.setCoords(im, (2 * pi, pi), (long, lat)), vector["coordinates"])
+                plotmap.MapPoints(coords, 20).draw(im)
+                im.save(os.path.join(self.workDir, "map.jpg"))
+        dbAccess.close()
+        return (time.time() - started, {"subjects": len(subjects), "mapDrawn": not Image == None})
+
+    def run(self, names):
+        results = {}
+        for name in names:
+            runs = []
+            for i in range(self.options.repeat):
+                runs.append(getattr(self, name)())
+            results[name] = summarize(runs)
+            print "%-20s median %8.3fs  min %8.3fs  %s" % (name, results[name]["median"], results[name]["min"], simplejson.dumps(runs[-1][1], sort_keys = True))
+            sys.stdout.flush()
+        return results
+
+    def close(self):
+        # the handler threads of the stub server are blocked on the connections kept alive by the pool
+        infofinders.httpPool.close()
+        self.server.close()
+        shutil.rmtree(self.workDir, True)
+
+
+def compare(results, previous):
+    """prints the median times of two result files side by side"""
+    print
+    print "%-20s %12s %12s %8s" % ("benchmark", previous["commit"][:10], results["commit"][:10], "ratio")
+    for name in sorted(results["results"]):
+        if name in previous["results"]:
+            (old, new) = (previous["results"][name]["median"], results["results"][name]["median"])
+            print "%-20s %11.3fs %11.3fs %7.2fx" % (name, old, new, new / max(old, 1e-9))
+
+def main(argv):
+    parser = OptionParser(usage = "usage: %prog [options]")
+    parser.add_option("-o", "--output", help = "JSON file to write the results to [benchmark-<commit>.json]")
+    parser.add_option("-c", "--compare", help = "results of a previous run to compare with")
+    parser.add_option("-b", "--benchmarks", default = ",".join(BENCHMARKS), help = "comma separated benchmarks to run [%default]")
+    parser.add_option("-r", "--repeat", type = "int", default = 3, help = "runs of each benchmark, the median is reported [%default]")
+    parser.add_option("--seed", type = "int", default = 0, help = "random seed of the generated data [%default]")
+    parser.add_option("--seed-db", default = os.path.join(HERE, "sample_entity_db_ccn.xml"), help = "database the entities are taken from [%default]")
+    parser.add_option("--entries", type = "int", default = 2000, help = "entries of the generated database [%default]")
+    parser.add_option("--entities", type = "int", default = 300, help = "distinct entities of the generated data [%default]")
+    parser.add_option("--feeds", type = "int", default = 5, help = "generated feeds [%default]")
+    parser.add_option("--feed-entries", type = "int", default = 20, help = "entries per generated feed [%default]")
+    parser.add_option("--pages", type = "int", default = 10, help = "pages rendered by the refresh benchmark [%default]")
+    parser.add_option("--page-size", type = "int", default = 4, help = "entries per page [%default]")
+    parser.add_option("--subjects", type = "int", default = 5, help = "entities queried by the analysis benchmarks [%default]")
+    parser.add_option("--ner-latency", type = "float", default = 0.05, help = "seconds per LingPipe request [%default]")
+    parser.add_option("--ner-document-latency", type = "float", default = 0.01, help = "seconds per document given to LingPipe [%default]")
+    parser.add_option("--ner-workers", type = "int", default = 1, help = "LingPipe stand-ins [%default]")
+    parser.add_option("--build-workers", type = "int", default = 8, help = "entry building threads [%default]")
+    parser.add_option("--web-latency", type = "float", default = 0.02, help = "seconds per web service request [%default]")
+    (options, args) = parser.parse_args(argv)
+    names = options.benchmarks.split(",")
+    for name in names:
+        if not name in BENCHMARKS:
+            parser.error("unknown benchmark %s" % name)
+
+    (commit, modified) = gitCommit()
+    metrics.reset()
+    benchmark = Benchmark(options)
+    try:
+        results = benchmark.run(names)
+    finally:
+        benchmark.close()
+    parameters = dict(vars(options))
+    del parameters["output"], parameters["compare"]
+    output = {"commit": commit, "modified": modified, "time": time.time(), "python": sys.version.split()[0],
+              "parameters": parameters, "results": results, "metrics": metrics.snapshot()}
+    filename = options.output or "benchmark-%s.json" % commit[:10]
+    outputFile = open(filename, "w")
+    simplejson.dump(output, outputFile, indent = 2, sort_keys = True)
+    outputFile.close()
+    print "results written to %s" % filename
+    if not options.compare == None:
+        compare(output, simplejson.load(open(options.compare)))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,248 @@
+'''
+Web 2.0 & Mobile Interaction -- Final Project
+December 4, 2009
+
+Olivier Jais-Nielsen (s090763)
+Andrea Lai (s091088)
+
+The Enhanced Feed Reader uses latent semantic analysis to identify people, organizations, and places within an RSS feed and pull in relevant additional content (Google Maps, Google Search, and recent tweets) for display.
+
+
+cache.py provides the caches used for the results of slow lookups
+'''
+
+import sys
+import time
+import threading
+import traceback
+import sqlite3
+from collections import OrderedDict
+from workers import WorkerPool
+from metrics import metrics
+
+DAY = 24 * 3600.
+
+
+class LruCache:
+    """
+    A dictionary holding at most size items, the least recently used ones being dropped first.
+    With sizeOf, size is a budget in the unit of sizeOf(value) (e.g. an estimate in bytes) instead of a number of items.
+    """
+
+    def __init__(self, size, sizeOf = None):
+        self._size = size
+        self._sizeOf = sizeOf
+        self._used = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        # key -> (value, cost)
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default = None):
+        self._lock.acquire()
+        try:
+            if not key in self._items:
+                self._misses += 1
+                return default
+            self._hits += 1
+            item = self._items.pop(key)
+            self._items[key] = item
+            return item[0]
+        finally:
+            self._lock.release()
+
+    def put(self, key, value):
+        cost = 1
+        if not self._sizeOf == None:
+            cost = self._sizeOf(value)
+        self._lock.acquire()
+        if key in self._items:
+            self._used -= self._items.pop(key)[1]
+        self._items[key] = (value, cost)
+        self._used += cost
+        while self._used > self._size and len(self._items) > 0:
+            self._used -= self._items.popitem(False)[1][1]
+            self._evictions += 1
+        self._lock.release()
+
+    def pop(self, key, default = None):
+        self._lock.acquire()
+        try:
+            if not key in self._items:
+                return default
+            (value, cost) = self._items.pop(key)
+            self._used -= cost
+            return value
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        self._lock.acquire()
+        self._items.clear()
+        self._used = 0
+        self._lock.release()
+
+    def stats(self):
+        self._lock.acquire()
+        try:
+            return {"items": len(self._items), "used": self._used, "size": self._size, "hits": self._hits, "misses": self._misses, "evictions": self._evictions}
+        finally:
+            self._lock.release()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class PersistentCache:
+    """
+    Stores string results of slow lookups (Wikipedia resolution, geocoding...) in a SQLite file, with a bounded LRU in memory in front of it.
+    Each kind of result has its own time to live. Failed lookups (an exception or an empty result) are cached as "" for negativeTtl.
+    The file is opened on first use and can be shared by several processes, e.g. the GUI and the batch reader.
+    """
+
+    def __init__(self, path, ttls, negativeTtl = DAY, memorySize = 10000):
+        self._path = path
+        self._ttls = ttls
+        self._negativeTtl = negativeTtl
+        self._memory = LruCache(memorySize)
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _db(self):
+        if self._connection == None:
+            self._connection = sqlite3.connect(self._path, timeout = 30, check_same_thread = False)
+            self._connection.execute("create table if not exists cache (kind text, key text, value text, expires real, primary key (kind, key))")
+            self._connection.commit()
+        return self._connection
+
+    def get(self, kind, key):
+        """returns a cached result, or None if there is none or it has expired"""
+        now = time.time()
+        cached = self._memory.get((kind, key))
+        if cached == None:
+            self._lock.acquire()
+            try:
+                cached = self._db().execute("select value, expires from cache where kind = ? and key = ?", (kind, key)).fetchone()
+            finally:
+                self._lock.release()
+            if cached == None:
+                return None
+            self._memory.put((kind, key), cached)
+        (value, expires) = cached
+        if expires < now:
+            return None
+        return value
+
+    def put(self, kind, key, value):
+        if value == "":
+            expires = time.time() + self._negativeTtl
+        else:
+            expires = time.time() + self._ttls[kind]
+        self._memory.put((kind, key), (value, expires))
+        self._lock.acquire()
+        try:
+            self._db().execute("insert or replace into cache values (?, ?, ?, ?)", (kind, key, value, expires))
+            self._db().commit()
+        finally:
+            self._lock.release()
+
+    def getMany(self, kind, keys):
+        """returns a dictionary of the cached results of some keys, counting them as cache hits"""
+        results = {}
+        for key in keys:
+            value = self.get(kind, key)
+            if not value == None:
+                results[key] = value
+                metrics.hit("cache." + kind, True)
+        return results
+
+    def lookup(self, kind, key, function):
+        """returns the cached result for key, or computes it with function(key) and caches it"""
+        value = self.get(kind, key)
+        metrics.hit("cache." + kind, not value == None)
+        if value == None:
+            try:
+                value = function(key)
+            except Exception:
+                traceback.print_exc(file = sys.stderr)
+                value = ""
+            self.put(kind, key, value)
+        return value
+
+    def purge(self):
+        """removes the expired results from the file"""
+        self._lock.acquire()
+        try:
+            self._db().execute("delete from cache where expires < ?", (time.time(),))
+            self._db().commit()
+        finally:
+            self._lock.release()
+        self._memory.clear()
+
+
+class ResponseCache:
+    """
+    Keeps the markup returned by the web services (tweets, searches) by (provider, query), for at most size responses, the least recently used being evicted first.
+    A response younger than freshFor is served as is. An older one is still served at once, but fetched again in the background (stale-while-revalidate);
+    it is only dropped after staleFor, or if it is evicted.
+    """
+
+    def __init__(self, freshFor = 600, staleFor = DAY, size = 1000, refreshWorkers = 2):
+        self._freshFor = freshFor
+        self._staleFor = staleFor
+        self._responses = LruCache(size)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._pool = WorkerPool(refreshWorkers, 0, "revalidation", True)
+        self.hits = 0
+        self.staleHits = 0
+        self.misses = 0
+
+    def peek(self, provider, query):
+        """returns (markup, fresh) for a cached response that has not expired, else None. Nothing is fetched."""
+        cached = self._responses.get((provider, query))
+        if cached == None:
+            return None
+        (markup, fetched) = cached
+        age = time.time() - fetched
+        if age >= self._staleFor:
+            return None
+        return (markup, age < self._freshFor)
+
+    def get(self, provider, query, fetch):
+        """returns the markup for a query, calling fetch(query) if there is none, or in the background if it is stale"""
+        cached = self.peek(provider, query)
+        if cached == None:
+            self.misses += 1
+            markup = fetch(query)
+            self._responses.put((provider, query), (markup, time.time()))
+            return markup
+        (markup, fresh) = cached
+        if fresh:
+            self.hits += 1
+        else:
+            self.staleHits += 1
+            self._revalidate((provider, query), fetch)
+        return markup
+
+    def _revalidate(self, key, fetch):
+        self._lock.acquire()
+        refreshing = key in self._refreshing
+        self._refreshing.add(key)
+        self._lock.release()
+        if not refreshing:
+            self._pool.submit(self._refresh, key, fetch)
+
+    def _refresh(self, key, fetch):
+        try:
+            # a failed refresh keeps the stale response
+            self._responses.put(key, (fetch(key[1]), time.time()))
+        finally:
+            self._lock.acquire()
+            self._refreshing.discard(key)
+            self._lock.release()
+
+    def stats(self):
+        return {"hits": self.hits, "staleHits": self.staleHits, "misses": self.misses, "size": len(self._responses)}
@@ -0,0 +1,198 @@
+'''
+Web 2.0 & Mobile Interaction -- Final Project
+December 4, 2009
+
+Olivier Jais-Nielsen (s090763)
+Andrea Lai (s091088)
+
+The Enhanced Feed Reader uses latent semantic analysis to identify people, organizations, and places within an RSS feed and pull in relevant additional content (Google Maps, Google Search, and recent tweets) for display.
+
+
+cooccurrence.py grades the similarity of an entity with all the others at once, from a sparse matrix of co-occurrence counts (requires NumPy and SciPy)
+'''
+
+import sys
+
+try:
+    import numpy
+    from scipy import sparse
+except ImportError:
+    numpy = None
+    sparse = None
+
+# maximum number of point to point distances computed at once
+DISTANCES_PER_CHUNK = 1000000
+# grades whose 1 / d is closer than this (relatively) to an integer are computed again the exact way
+ROUNDING_TOLERANCE = 1e-6
+
+
+def available():
+    return not numpy == None
+
+def sphereDists(points1, points2):
+    """spherical distances (as in dbaccess.sphereDist) between every point of points1 (rows) and of points2 (columns), points in radians"""
+    lat1 = points1[:, 0][:, numpy.newaxis]
+    long1 = points1[:, 1][:, numpy.newaxis]
+    lat2 = points2[:, 0][numpy.newaxis, :]
+    long2 = points2[:, 1][numpy.newaxis, :]
+    a = numpy.sin((lat2 - lat1) / 2) ** 2 + numpy.cos(lat1) * numpy.cos(lat2) * (numpy.sin((long2 - long1) / 2) ** 2)
+    a = numpy.clip(a, 0., 1.)
+    return 2 * numpy.arctan2(numpy.sqrt(a), numpy.sqrt(1 - a)) / numpy.pi
+
+
+class CooccurrenceMatrix:
+    """
+    The entity x entity matrix of co-occurrence counts, built from the entities of the entries (lists of (type, name, coordinates) as indexed by DbAccess):
+    row s counts the entities appearing next to s, with the same sibling rule as DbAccess.getEntityVector.
+    The coordinates of the locations appearing next to each entity are kept as distinct points with their multiplicities.
+    Entries are added in batches, new entities getting the next rows and columns.
+
+    The vectors of DbAccess are the rows divided by the number of entries, restricted to the columns of the types in axes,
+    so the squared distance between two of them is computed from integer dot products, with a correction for the columns that simEntities excludes.
+    The floating point result may differ in its last bits from the sums of DbAccess.distVectors, so the grades too close to an integer
+    are handed back to the exact (slow) computation, and the results are the same as those of simEntities.
+    """
+
+    def __init__(self, entryEntities = []):
+        self._nMax = 0
+        self._ids = {}
+        self._typeNames = []
+        self._types = numpy.zeros(0, numpy.int32)
+        self._matrix = sparse.csr_matrix((0, 0), dtype = numpy.int64)
+        self._diagonal = numpy.zeros(0, numpy.int64)
+        # by entity: {point: multiplicity}, and the same as arrays (made when needed)
+        self._points = []
+        self._pointArrays = {}
+        self._pointCounts = numpy.zeros(0, numpy.int64)
+        self._pointTotals = numpy.zeros(0, numpy.int64)
+        self.addEntries(entryEntities)
+
+    def entries(self):
+        """returns the number of entries added"""
+        return self._nMax
+
+    def addEntries(self, entryEntities):
+        if len(entryEntities) == 0:
+            return
+        types = []
+        rows = []
+        columns = []
+        touched = set()
+        for entities in entryEntities:
+            ids = [self._id(type, name, types) for (type, name, coordinates) in entities]
+            for (i, subject) in enumerate(ids):
+                if ids.index(subject) < i:
+                    continue
+                single = ids.count(subject) == 1
+                for (j, (type, name, coordinates)) in enumerate(entities):
+                    if single and j == i:
+                        continue
+                    rows.append(subject)
+                    columns.append(ids[j])
+                    if not coordinates == None:
+                        self._points[subject][coordinates] = self._points[subject].get(coordinates, 0) + 1
+                        touched.add(subject)
+        self._nMax += len(entryEntities)
+        size = len(self._ids)
+        added = size - self._matrix.shape[0]
+        # the current counts, with empty rows and columns for the new entities
+        matrix = sparse.csr_matrix((self._matrix.data, self._matrix.indices, numpy.concatenate([self._matrix.indptr, numpy.repeat(self._matrix.indptr[-1:], added)])), shape = (size, size))
+        self._matrix = matrix + sparse.coo_matrix((numpy.ones(len(rows), numpy.int64), (rows, columns)), shape = (size, size)).tocsr()
+        self._diagonal = self._matrix.diagonal()
+        self._types = numpy.concatenate([self._types, numpy.array(types, numpy.int32)])
+        self._pointCounts = numpy.concatenate([self._pointCounts, numpy.zeros(added, numpy.int64)])
+        self._pointTotals = numpy.concatenate([self._pointTotals, numpy.zeros(added, numpy.int64)])
+        for i in touched:
+            self._pointArrays.pop(i, None)
+            self._pointCounts[i] = len(self._points[i])
+            self._pointTotals[i] = sum(self._points[i].values())
+
+    def _id(self, type, name, types):
+        if not (type, name) in self._ids:
+            self._ids[(type, name)] = len(self._ids)
+            if not type in self._typeNames:
+                self._typeNames.append(type)
+            types.append(self._typeNames.index(type))
+            self._points.append({})
+        return self._ids[(type, name)]
+
+    def _pointArray(self, i):
+        """returns the distinct points next to entity i and their multiplicities, as arrays"""
+        if not i in self._pointArrays:
+            items = self._points[i].items()
+            self._pointArrays[i] = (numpy.array([point for (point, weight) in items], numpy.float64).reshape((len(items), 2)), numpy.array([weight for (point, weight) in items], numpy.float64))
+        return self._pointArrays[i]
+
+    def __contains__(self, (type, name)):
+        return (type, name) in self._ids
+
+    def _columnMask(self, axes):
+        if axes == []:
+            return numpy.ones(len(self._ids), numpy.int64)
+        return numpy.in1d(self._types, [i for (i, type) in enumerate(self._typeNames) if type in axes]).astype(numpy.int64)
+
+    def _squareCoordinateDists(self, subject, candidates):
+        """returns dbaccess.squareDistCoords between the coordinates of subject and those of each candidate, 0 where both have none"""
+        dists = numpy.zeros(len(candidates))
+        subjectCount = self._pointCounts[subject]
+        counts = self._pointCounts[candidates]
+        # one of the sets is empty: every point of the other is at distance 1
+        dists[(counts == 0) != (subjectCount == 0)] = 1.
+        if subjectCount == 0:
+            return dists
+        (subjectPoints, subjectWeights) = self._pointArray(subject)
+        withPoints = numpy.nonzero(counts > 0)[0]
+        chunkSize = max(1, DISTANCES_PER_CHUNK / subjectCount)
+        start = 0
+        while start < len(withPoints):
+            # as many candidates as fit in a chunk, at least one
+            cumulated = numpy.cumsum(counts[withPoints[start:]])
+            end = start + max(1, numpy.searchsorted(cumulated, chunkSize, "right"))
+            chunk = withPoints[start:end]
+            chunkCandidates = candidates[chunk]
+            points = numpy.concatenate([self._pointArray(i)[0] for i in chunkCandidates])
+            weights = numpy.concatenate([self._pointArray(i)[1] for i in chunkCandidates])
+            offsets = numpy.concatenate([[0], numpy.cumsum(self._pointCounts[chunkCandidates])[:-1]])
+            distances = sphereDists(subjectPoints, points)
+            # each point of a candidate to the subject's set, and each point of the subject's set to the candidate's
+            toSubject = numpy.add.reduceat(numpy.minimum(distances.min(axis = 0), 1.) * weights, offsets)
+            toCandidate = (numpy.minimum(numpy.minimum.reduceat(distances, offsets, axis = 1), 1.) * subjectWeights[:, numpy.newaxis]).sum(axis = 0)
+            average = (toSubject + toCandidate) / (self._pointTotals[subject] + self._pointTotals[chunkCandidates])
+            dists[chunk] = average ** 2
+            start = end
+        return dists
+
+    def grades(self, subjectName, subjectType, names, axes, exactGrade):
+        """returns the grades of DbAccess.simEntities between an entity and each of names (entities of the same type), exactGrade(name) being used near integers"""
+        if len(names) == 0:
+            return []
+        subject = self._ids[(subjectType, subjectName)]
+        candidates = numpy.array([self._ids[(subjectType, name)] for name in names], numpy.int64)
+        mask = self._columnMask(axes)
+        subjectRow = self._matrix[subject].multiply(mask).tocsr()
+        rows = self._matrix[candidates].multiply(mask).tocsr()
+        squares = numpy.asarray(rows.multiply(rows).sum(axis = 1)).ravel() + subjectRow.multiply(subjectRow).sum() - 2 * numpy.asarray(rows.dot(subjectRow.T).todense()).ravel()
+        if mask[subject]:
+            # the vector of the subject leaves out the candidate's column, the one of the candidate the subject's
+            subjectCounts = numpy.asarray(subjectRow.todense()).ravel()
+            sc = subjectCounts[candidates]
+            ss = subjectCounts[subject]
+            cc = self._diagonal[candidates]
+            cs = numpy.asarray(rows[:, subject].todense()).ravel()
+            squares = squares - (sc - cc) ** 2 - (ss - cs) ** 2 + cc ** 2 + ss ** 2
+        d2 = squares / float(self._nMax) ** 2
+        if axes == [] or "coordinates" in axes:
+            d2 = d2 + self._squareCoordinateDists(subject, candidates)
+        d = numpy.sqrt(d2)
+
+        grades = []
+        for (name, distance) in zip(names, d):
+            if distance == 0:
+                grades.append(sys.maxint)
+                continue
+            inverse = 1 / distance
+            if abs(inverse - round(inverse)) <= ROUNDING_TOLERANCE * max(1., inverse):
+                grades.append(exactGrade(name))
+            else:
+                grades.append(int(inverse))
+        return grades
@@ -12,27 +12,37 @@ dbaccess.py holds the vectors associated with entities and calculates their simi
 '''
 
 from lxml import etree
+from copy import deepcopy
 from math import pi, sqrt, sin, cos, atan2
 import sys
-from tools import escapeQuotesXml
+import bisect
+import threading
+from collections import OrderedDict
+from metrics import metrics, timed
+from cache import LruCache
+import cooccurrence
+
+# rough memory taken by an entity or a point of a cached vector, in bytes
+VECTOR_ITEM_BYTES = 150
 
 def distVectors(vector1, vector2):
-    """calculate the distance between two vectors"""
+    """calculate the distance between two vectors (missing keys count as 0, or no coordinates). The vectors are left as they are."""
     keys1 = set(vector1.keys())
     keys2 = set(vector2.keys())
     d = 0
     for key in (keys1 | keys2):
         if key == "coordinates":
-            vector1.setdefault(key, [])
-            vector2.setdefault(key, [])
-            d += squareDistCoords(vector1[key], vector2[key])
+            d += squareDistCoords(vector1.get(key, []), vector2.get(key, []))
         else:
-            vector1.setdefault(key, 0)
-            vector2.setdefault(key, 0)
-            d += (vector1[key] - vector2[key])**2
+            d += (vector1.get(key, 0) - vector2.get(key, 0))**2
     return sqrt(d)
 
 
+def vectorBytes(counts):
+    """estimates the memory taken by a cached vector"""
+    return VECTOR_ITEM_BYTES * (len(counts) + len(counts.get("coordinates", [])))
+
+
 def sphereDist((lat1, long1), (lat2, long2)):
     """calculate spherical distance between two points where the coordinates are known in longitude and latitude"""
     a = sin((lat2 - lat1) / 2)**2 + cos(lat1) * cos(lat2) * (sin((long2 - long1) / 2)**2)
@@ -52,42 +62,161 @@ def squareDistCoords(coords1, coords2):
 
 
 class DbAccess:
-    def __init__(self, entityDb):
+    """
+    Answers the queries of the database browser from an index built once: the entities of every entry (entry id -> [(type, name, coordinates)],
+    in document order) and their posting lists ((type, name) -> ids of the entries where the entity appears, in increasing order).
+    The types (in order of appearance) and the sorted names of each type are kept with them for the entity selectors.
+    With NumPy and SciPy, getSimsWithEntity grades all the candidates at once from a co-occurrence matrix built on its first call.
+
+    The vectors are cached by (type, name, frozenset of axes) in an LRU within vectorCacheBytes (estimated), as counts,
+    divided by the current number of entries when they are read. The vectors without some entities (exclude) are made from these.
+    The values are sums of 1 / n and the keys are in order of appearance, as when the vectors were built from the tree, so that the grades do not change.
+
+    When the database is an EfrDb, the entries appended to it (and the files loaded into it) are queued as they arrive
+    and taken into account at the next query: the new entries are indexed and added to the matrix, and only the cached vectors
+    of the entities they contain are dropped.
+    """
+
+    def __init__(self, entityDb, vectorCacheBytes = 64 * 1024 * 1024):
         self._entityDb = entityDb
-        self._nMax = len(self._entityDb.getroot())
-        self._cacheVector = {}
+        self._lock = threading.Lock()
+        self._pending = []
+        self._reloaded = False
+        self._vectors = LruCache(vectorCacheBytes, vectorBytes)
+        metrics.addSource("dbaccess.vectorCache", self._vectors.stats)
+        self._reset()
+        if hasattr(entityDb, "addListener"):
+            entityDb.addListener(self._entryAppended, self._dbReloaded)
+
+    def close(self):
+        """stops following the changes of the database"""
+        if hasattr(self._entityDb, "removeListener"):
+            self._entityDb.removeListener(self._entryAppended, self._dbReloaded)
+
+    def _reset(self):
+        self._nMax = 0
+        self._sums = [0]
+        self._vectors.clear()
+        # (type, name) -> axes of the vectors cached for the entity
+        self._cachedAxes = {}
+        self._entries = []
+        self._entryEntities = []
+        self._links = set()
+        self._postings = {}
+        self._types = []
+        self._names = {}
+        self._cooccurrences = None
+        for entry in self._entityDb.getroot():
+            self._indexEntry(entry)
+
+    def _entryAppended(self, entry):
+        """called by the database, from the thread appending the entry"""
+        self._lock.acquire()
+        self._pending.append(entry)
+        self._lock.release()
 
+    def _dbReloaded(self):
+        self._lock.acquire()
+        self._reloaded = True
+        self._pending = []
+        self._lock.release()
 
-    def cacheHashKey(self, subjectName, subjectType, exclude, axes):
-        """prevents redundancy of calculation"""
-        return (subjectName, subjectType, "".join(map(lambda (x, y): x + y, exclude)), "".join(axes))
+    def _update(self):
+        """applies the changes of the database since the last query"""
+        self._lock.acquire()
+        (pending, reloaded) = (self._pending, self._reloaded)
+        self._pending = []
+        self._reloaded = False
+        self._lock.release()
+        if reloaded:
+            self._reset()
+        for entry in pending:
+            if entry.get("link") in self._links:
+                # already under the root when the index was rebuilt, e.g. the journal replayed by EfrDb.load
+                continue
+            for (type, name, coordinates) in self._indexEntry(entry):
+                for axes in self._cachedAxes.pop((type, name), []):
+                    self._vectors.pop((type, name, axes))
 
+    def _indexEntry(self, entry):
+        """gives the next entry id to an entry and adds it to the posting lists of its entities"""
+        entryId = len(self._entries)
+        entities = []
+        for entity in entry.xpath("head/entity"):
+            coordinates = None
+            if entity.get("type") == "LOCATION" and not entity.get("coordinates", "") == "":
+                lat, long = tuple(map(float, entity.get("coordinates").split()))
+                lat *= pi / 180.
+                long *= pi / 180.
+                coordinates = (lat, long)
+            entities.append((entity.get("type"), entity.text, coordinates))
+            postings = self._postings.setdefault((entity.get("type"), entity.text), [])
+            if len(postings) == 0:
+                self._addName(entity.get("type"), entity.text)
+            if len(postings) == 0 or postings[-1] < entryId:
+                postings.append(entryId)
+        self._entries.append(entry)
+        self._entryEntities.append(entities)
+        self._links.add(entry.get("link"))
+        self._nMax = len(self._entries)
+        self._sums = [0]
+        return entities
+
+    def _normalize(self, count):
+        """returns count / n, summed as count times 1. / n (the sums are kept until n changes)"""
+        while len(self._sums) <= count:
+            self._sums.append(self._sums[-1] + 1. / self._nMax)
+        return self._sums[count]
+
+    def _addName(self, type, name):
+        if not type in self._names:
+            self._types.append(type)
+            self._names[type] = []
+        if not name == None:
+            bisect.insort(self._names[type], name)
+
+    def _siblings(self, subjectName, subjectType):
+        """returns the entities appearing next to an entity, in document order. The entity itself is included where it appears more than once in an entry."""
+        siblings = []
+        for entryId in self._postings.get((subjectType, subjectName), []):
+            entities = self._entryEntities[entryId]
+            occurrences = [i for (i, (type, name, coordinates)) in enumerate(entities) if type == subjectType and name == subjectName]
+            if len(occurrences) == 1:
+                siblings.extend(entities[:occurrences[0]] + entities[occurrences[0] + 1:])
+            else:
+                siblings.extend(entities)
+        return siblings
+
+
+    @timed("dbaccess.getEntityVector")
     def getEntityVector(self, subjectName, subjectType, exclude = [], axes = []):
         """generate the vector (linking of people, places, and organizations that appear in the same feed entry) for an entity"""
-        self._cacheVector.setdefault(self.cacheHashKey(subjectName, subjectType, exclude, axes), None)
-        if self._cacheVector[self.cacheHashKey(subjectName, subjectType, exclude, axes)] == None:
-            vector = {}
-            xpathQuery = u"//entity[@type = \"%s\" and . = \"%s\"]/preceding-sibling::* | //entity[@type = \"%s\" and . = \"%s\"]/following-sibling::*" % (escapeQuotesXml(subjectType), escapeQuotesXml(subjectName), escapeQuotesXml(subjectType), escapeQuotesXml(subjectName))
-            
-            associatedEntities = self._entityDb.xpath(xpathQuery)
-            for entity in associatedEntities:
-                type = entity.get("type")
-                name = entity.text
-                if (axes == [] or type in axes) and not((name, type) in exclude):
-                    vector.setdefault((type, name), 0)
-                    vector[(type, name)] += 1. / self._nMax
-                if entity.get("type") == "LOCATION" and not(entity.get("coordinates") == "") and (axes == [] or "coordinates" in axes):
-                    lat, long = tuple(map(float, entity.get("coordinates").split()))
-                    lat *= pi / 180.
-                    long *= pi / 180.
-                    vector.setdefault("coordinates", [])
-                    vector["coordinates"].append((lat, long))
-            self._cacheVector[self.cacheHashKey(subjectName, subjectType, exclude, axes)] = vector.copy()
-            return self._cacheVector[self.cacheHashKey(subjectName, subjectType, exclude, axes)]
-        else:
-            return self._cacheVector[self.cacheHashKey(subjectName, subjectType, exclude, axes)]
+        self._update()
+        key = (subjectType, subjectName, frozenset(axes))
+        counts = self._vectors.get(key)
+        metrics.hit("dbaccess.vectors", not counts == None)
+        if counts == None:
+            counts = OrderedDict()
+            for (type, name, coordinates) in self._siblings(subjectName, subjectType):
+                if axes == [] or type in axes:
+                    counts[(type, name)] = counts.get((type, name), 0) + 1
+                if not coordinates == None and (axes == [] or "coordinates" in axes):
+                    counts.setdefault("coordinates", [])
+                    counts["coordinates"].append(coordinates)
+            self._vectors.put(key, counts)
+            self._cachedAxes.setdefault((subjectType, subjectName), set()).add(key[2])
+        # excluded entities are left out of the copy, their coordinates are kept
+        vector = {}
+        for (key, count) in counts.items():
+            if key == "coordinates":
+                vector[key] = list(count)
+            elif not (key[1], key[0]) in exclude:
+                vector[key] = self._normalize(count)
+        # a copy, with the layout (and so the order of the keys in distVectors) of the vectors the tree queries returned
+        return vector.copy()
 
 
+    @timed("dbaccess.simEntities")
     def simEntities(self, subjectType, subjectName1, subjectName2, axes = []):
         """Calculate the Euclidean distance between two entities of the same type."""
         vector1 = self.getEntityVector(subjectName1, subjectType, [(subjectName2, subjectType)], axes)
@@ -99,35 +228,60 @@ class DbAccess:
             return int(1 / d)
 
 
+    @timed("dbaccess.getSimsWithEntity")
     def getSimsWithEntity(self, subjectName, subjectType, axes = []):
-        xpathQuery = u"//entity[@type = \"%s\" and not( . = \"%s\")]" % (escapeQuotesXml(subjectType), escapeQuotesXml(subjectName))
-        
-        entities = set(map(lambda entity: entity.text, self._entityDb.xpath(xpathQuery)))
+        self._update()
+        entities = set([name for (type, name) in self._postings if type == subjectType and not name == subjectName])
+        if cooccurrence.available() and (subjectType, subjectName) in self._postings:
+            if self._cooccurrences == None:
+                self._cooccurrences = cooccurrence.CooccurrenceMatrix()
+            # the entries indexed since the last call
+            self._cooccurrences.addEntries(self._entryEntities[self._cooccurrences.entries():])
+            names = list(entities)
+            return zip(names, self._cooccurrences.grades(subjectName, subjectType, names, axes, lambda name: self.simEntities(subjectType, subjectName, name, axes)))
         return map(lambda entity: (entity, self.simEntities(subjectType, subjectName, entity, axes)), entities)
 
+    @timed("dbaccess.searchEntries")
     def searchEntries(self, entities):
         """ Search feed entries for an entity. Returns only entries with items matching the search string"""
-        entitiesConstraint = ""
-        if len(entities) > 0:
-            entitiesConstraint = u"[" + u" and ".join(map(lambda (name, type): u"head/entity[@type = \"%s\" and . = \"%s\"]" % (escapeQuotesXml(type), escapeQuotesXml(name)), entities)) + u"]"
-        xpathQuery = u"//entry" + entitiesConstraint
+        self._update()
+        if len(entities) == 0:
+            entryIds = range(len(self._entries))
+        else:
+            # intersects the posting lists, starting with the shortest
+            postingLists = sorted([self._postings.get((type, name), []) for (name, type) in entities], key = len)
+            entryIds = postingLists[0]
+            for postings in postingLists[1:]:
+                postings = set(postings)
+                entryIds = [entryId for entryId in entryIds if entryId in postings]
 
         subDb = etree.ElementTree(etree.Element("efrDb"))
-        subDb.getroot().extend(self._entityDb.xpath(xpathQuery))
+        # copies, so that the entries are not moved out of the database
+        subDb.getroot().extend([deepcopy(self._entries[entryId]) for entryId in entryIds])
         return subDb
 
+    @timed("dbaccess.getTypes")
     def getTypes(self):
         """ get entity type (person, location, or organization)"""
-        xpathQuery = u"//@type[not(preceding::*/@type = .)]"
-        return self._entityDb.xpath(xpathQuery)
+        self._update()
+        return list(self._types)
 
+    @timed("dbaccess.getNames")
     def getNames(self, searchType):
-        """get entity name -- the specific entity (eg. Location = Denmark)"""
-        xpathQuery = u"//entity[@type = \"%s\" and not(preceding::* = .)]/text()" % escapeQuotesXml(searchType)
-        return self._entityDb.xpath(xpathQuery)
+        """get entity name -- the specific entity (eg. Location = Denmark), in alphabetical order"""
+        self._update()
+        return list(self._names.get(unicode(searchType), []))
+
+    @timed("dbaccess.getNameCounts")
+    def getNameCounts(self, searchType):
+        """get the names of the entities of a type with the number of entries they appear in, in alphabetical order"""
+        self._update()
+        return [(name, len(self._postings[(unicode(searchType), name)])) for name in self._names.get(unicode(searchType), [])]
 
+    @timed("dbaccess.getAssociationsToEntity")
     def getAssociationsToEntity(self, subjectName, subjectType, axes):
         """get associations to some entity"""
+        self._update()
         vector = self.getEntityVector(subjectName, subjectType, axes)
         return map(lambda (type, name): ((name, type), vector[(type, name)]), vector.keys())
 
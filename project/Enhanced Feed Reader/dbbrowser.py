@@ -14,7 +14,6 @@ dbbrowser.py sets up the interface for the search/database browser element
 from PyQt4.QtCore import *
 from PyQt4.QtGui import *
 from lxml import etree
-from dbaccess import DbAccess
 import plotmap
 from PIL import Image
 from math import pi
@@ -83,7 +82,7 @@ class EntitySelector(QVBoxLayout):
 		
     def setNameCombo(self):
         self._nameCombo.clear()
-        for name in sorted(self._parent.dbAccess.getNames(self._typeCombo.currentText())):
+        for name in self._parent.dbAccess.getNames(self._typeCombo.currentText()):
             self._nameCombo.addItem(name)
 
     def getEntity(self):
@@ -124,12 +123,13 @@ class EntitySelector(QVBoxLayout):
 
 
 class DbBrowser(QMainWindow):
-    def __init__(self, efrDb, parent = None, entities = []):
+    def __init__(self, dbAccess, parent = None, entities = []):
         QMainWindow.__init__(self, parent, Qt.Tool)
 
         self._parent = parent
 
-        self.dbAccess = DbAccess(efrDb)
+        # shared with the feed reader, and kept up to date as entries arrive
+        self.dbAccess = dbAccess
 
         self.setWindowTitle("Entity database browser")
 
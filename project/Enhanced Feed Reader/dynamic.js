@@ -62,3 +62,15 @@ function updateSubmitter() {
     document.getElementById("submit").attributes["href"].value = url;
 }
 
+
+function fillEnrichment(key, html) {
+    placeholders = document.getElementsByClassName("PENDING");
+    // the collection shrinks as placeholders are filled
+    for (i = placeholders.length - 1; i >= 0; i--) {
+        if (placeholders[i].attributes["title"].value == key) {
+            placeholders[i].innerHTML = html;
+            placeholders[i].removeAttribute("title");
+            placeholders[i].className = "ENRICHMENT";
+        }
+    }
+}
@@ -0,0 +1,340 @@
+'''
+Web 2.0 & Mobile Interaction -- Final Project
+December 4, 2009
+
+Olivier Jais-Nielsen (s090763)
+Andrea Lai (s091088)
+
+The Enhanced Feed Reader uses latent semantic analysis to identify people, organizations, and places within an RSS feed and pull in relevant additional content (Google Maps, Google Search, and recent tweets) for display.
+
+
+efrdb.py holds the entity database and keeps an index of the entries it contains
+'''
+
+import os
+import copy
+import tempfile
+import threading
+from lxml import etree
+from tools import normalizeUrl
+
+SNAPSHOT_HEADER = "<?xml version='1.0' encoding='UTF-8'?>\n<efrDb>"
+SNAPSHOT_FOOTER = "</efrDb>"
+# attribute of the entry headers holding the key of their body in the BodyStore (never written to files)
+BODY_ID = "bodyId"
+
+
+def readJournal(filename):
+    """returns the entries recorded in a journal file and the length of its valid part. A record truncated by a crash ends the journal."""
+    entries = []
+    length = 0
+    if os.path.exists(filename):
+        journal = open(filename, "rb")
+        while True:
+            header = journal.readline()
+            if not header.strip().isdigit():
+                break
+            data = journal.read(int(header))
+            if len(data) < int(header) or journal.read(1) != "\n":
+                break
+            entries.append(etree.fromstring(data))
+            length = journal.tell()
+        journal.close()
+    return (entries, length)
+
+def writeSnapshot(filename, snapshot, journals):
+    """writes the entries of a snapshot followed by those of some journals to a new snapshot, streaming instead of building the whole tree"""
+    temporary = filename + ".tmp"
+    output = open(temporary, "wb")
+    output.write(SNAPSHOT_HEADER)
+    links = set()
+    def writeEntry(entry):
+        output.write(etree.tostring(entry, encoding = "UTF-8", xml_declaration = False, with_tail = False))
+    if os.path.exists(snapshot):
+        for (event, entry) in etree.iterparse(snapshot, tag = "entry"):
+            links.add(entry.get("link"))
+            writeEntry(entry)
+            entry.clear()
+            while not entry.getprevious() == None:
+                del entry.getparent()[0]
+    for journal in journals:
+        for entry in readJournal(journal)[0]:
+            # journal records may already be in the snapshot if a compaction was interrupted (the entries of the snapshot itself are all kept)
+            if not entry.get("link") in links:
+                links.add(entry.get("link"))
+                writeEntry(entry)
+    output.write(SNAPSHOT_FOOTER)
+    output.close()
+    if os.name == "nt" and os.path.exists(filename):
+        os.remove(filename)
+    os.rename(temporary, filename)
+
+
+class BodyStore:
+    """Keeps the serialized bodies of the entries in a temporary file, each under a number of its own (links may be missing or repeated)"""
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile()
+        self._offsets = []
+        self._lock = threading.Lock()
+
+    def put(self, body):
+        """stores a body and returns its key"""
+        data = etree.tostring(body, encoding = "UTF-8", xml_declaration = False, with_tail = False)
+        self._lock.acquire()
+        try:
+            self._file.seek(0, 2)
+            self._offsets.append((self._file.tell(), len(data)))
+            self._file.write(data)
+            return len(self._offsets) - 1
+        finally:
+            self._lock.release()
+
+    def get(self, key):
+        """returns a new copy of the body stored under a key, or None if there is none"""
+        self._lock.acquire()
+        try:
+            if not 0 <= key < len(self._offsets):
+                return None
+            (offset, length) = self._offsets[key]
+            self._file.seek(offset)
+            return etree.fromstring(self._file.read(length))
+        finally:
+            self._lock.release()
+
+    def close(self):
+        self._file.close()
+
+
+
+
+class EfrDb:
+    """
+    The <efrDb> tree of entries, with a set of their links (as given and normalized) and feed ids, and the list of entity types.
+    Duplicate detection is a set lookup, and can be done from the ingestion threads.
+
+    Files are loaded with iterparse and, with lazyBodies, only the entry headers stay in the tree: bodies go to a BodyStore,
+    under a key kept in the bodyId attribute of the header, and are only loaded into the copies of the entries made for display or saving (withBodies).
+
+    Once loaded from or saved to a file, the database is journaled: every new entry is appended to <file>.journal
+    as it is added, and the journal is merged into the snapshot in a background thread every compactEvery entries.
+    Loading replays the journal on top of the snapshot, and closing merges it into the snapshot.
+
+    Listeners are told about every entry appended (onEntry(entry), from the thread appending it) and about every file parsed in place of the entries (onReload()).
+    """
+
+    def __init__(self, tree = None, compactEvery = 200, lazyBodies = True):
+        if tree == None:
+            tree = etree.ElementTree(etree.Element("efrDb"))
+        self.tree = tree
+        self._lock = threading.Lock()
+        self._filename = None
+        self._journal = None
+        self._journalSize = 0
+        self._compactEvery = compactEvery
+        self._compaction = None
+        self._lazyBodies = lazyBodies
+        self._bodies = None
+        self._listeners = []
+        self._reindex()
+
+    def _reindex(self):
+        self._lock.acquire()
+        self._links = set()
+        self._normalizedLinks = set()
+        self._guids = set()
+        self.types = []
+        if not self._bodies == None:
+            self._bodies.close()
+        self._bodies = None
+        if self._lazyBodies:
+            self._bodies = BodyStore()
+        for entry in self.tree.getroot():
+            self._index(entry)
+        self._lock.release()
+
+    def _index(self, entry):
+        link = entry.get("link", "")
+        self._links.add(link)
+        self._normalizedLinks.add(normalizeUrl(link))
+        if entry.get("guid"):
+            self._guids.add(entry.get("guid"))
+        for type in entry.xpath("head/entity/@type"):
+            if not type in self.types:
+                self.types.append(str(type))
+        # a key from another database's store means nothing here
+        entry.attrib.pop(BODY_ID, None)
+        body = entry.find("body")
+        if not self._bodies == None and not body == None:
+            entry.set(BODY_ID, str(self._bodies.put(body)))
+            entry.remove(body)
+
+    def _contains(self, link, guid):
+        return link in self._links or normalizeUrl(link) in self._normalizedLinks or (bool(guid) and guid in self._guids)
+
+    def contains(self, link, guid = None):
+        """checks whether an entry with the given link (or normalized link, or feed id) is in the database"""
+        self._lock.acquire()
+        try:
+            return self._contains(link, guid)
+        finally:
+            self._lock.release()
+
+    def addListener(self, onEntry, onReload = None):
+        self._lock.acquire()
+        self._listeners.append((onEntry, onReload))
+        self._lock.release()
+
+    def removeListener(self, onEntry, onReload = None):
+        self._lock.acquire()
+        self._listeners.remove((onEntry, onReload))
+        self._lock.release()
+
+    def append(self, entry):
+        """appends an entry unless it is already in the database. Returns whether it was appended."""
+        self._lock.acquire()
+        try:
+            if self._contains(entry.get("link", ""), entry.get("guid")):
+                return False
+            if not self._journal == None:
+                self._record(entry)
+            self._index(entry)
+            self.tree.getroot().append(entry)
+            listeners = list(self._listeners)
+        finally:
+            self._lock.release()
+        for (onEntry, onReload) in listeners:
+            onEntry(entry)
+        return True
+
+    def body(self, entry):
+        """returns the body of an entry of this database (or a copy of one), loading it if needed"""
+        body = entry.find("body")
+        if body == None and not self._bodies == None and not entry.get(BODY_ID) == None:
+            body = self._bodies.get(int(entry.get(BODY_ID)))
+        return body
+
+    def withBodies(self, entry):
+        """returns a copy of an entry, with its body"""
+        entryCopy = copy.deepcopy(entry)
+        entryCopy.attrib.pop(BODY_ID, None)
+        if entryCopy.find("body") == None:
+            body = self.body(entry)
+            if not body == None:
+                entryCopy.append(body)
+        return entryCopy
+
+    def _record(self, entry):
+        data = etree.tostring(self.withBodies(entry), encoding = "UTF-8", xml_declaration = False, with_tail = False)
+        self._journal.write("%d\n%s\n" % (len(data), data))
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self._journalSize += 1
+        if self._journalSize >= self._compactEvery and (self._compaction == None or not self._compaction.isAlive()):
+            self._startCompaction()
+
+    def _startCompaction(self):
+        """moves the current journal aside and merges it into the snapshot in a background thread. Called with the lock held."""
+        journal = self._filename + ".journal"
+        if os.path.exists(journal + ".compacting"):
+            # a failed compaction is left for the next load to recover
+            return
+        self._journal.close()
+        os.rename(journal, journal + ".compacting")
+        self._journal = open(journal, "ab")
+        self._journalSize = 0
+        self._compaction = threading.Thread(target = self._compact, args = (self._filename,), name = "compaction")
+        self._compaction.start()
+
+    def _compact(self, filename):
+        compacting = filename + ".journal.compacting"
+        writeSnapshot(filename, filename, [compacting])
+        os.remove(compacting)
+
+    def _waitCompaction(self):
+        if not self._compaction == None:
+            self._compaction.join()
+            self._compaction = None
+
+    def close(self):
+        """stops journaling, once the running compaction is over, and merges what is left of the journal into the snapshot"""
+        self._waitCompaction()
+        if not self._journal == None:
+            self._journal.close()
+            self._journal = None
+            if self._journalSize > 0:
+                # the snapshot is then complete for the readers of plain XML (merging, XSLT). If this is interrupted, loading replays the journal.
+                journal = self._filename + ".journal"
+                writeSnapshot(self._filename, self._filename, [journal])
+                open(journal, "wb").close()
+                self._journalSize = 0
+        self._filename = None
+
+    def load(self, filename):
+        """loads a snapshot and replays its journal, then journals the new entries"""
+        self.close()
+        journal = filename + ".journal"
+        if os.path.exists(journal + ".compacting"):
+            # recovers from a compaction interrupted by a crash
+            writeSnapshot(filename, filename, [journal + ".compacting", journal])
+            os.remove(journal + ".compacting")
+            open(journal, "wb").close()
+        self.parse(filename)
+        (entries, length) = readJournal(journal)
+        for entry in entries:
+            self.append(entry)
+        self._lock.acquire()
+        self._filename = filename
+        self._journal = open(journal, "ab")
+        # drops a record truncated by a crash
+        self._journal.truncate(length)
+        self._journalSize = len(entries)
+        self._lock.release()
+
+    def save(self, filename):
+        """writes the whole database to a snapshot and journals the new entries"""
+        self.close()
+        self._lock.acquire()
+        try:
+            savedDb = open(filename, "wb")
+            savedDb.write(SNAPSHOT_HEADER)
+            for entry in self.tree.getroot():
+                savedDb.write(etree.tostring(self.withBodies(entry), encoding = "UTF-8", xml_declaration = False, with_tail = False))
+            savedDb.write(SNAPSHOT_FOOTER)
+            savedDb.close()
+            self._filename = filename
+            self._journal = open(filename + ".journal", "wb")
+            self._journalSize = 0
+            if os.path.exists(filename + ".journal.compacting"):
+                os.remove(filename + ".journal.compacting")
+        finally:
+            self._lock.release()
+
+    def merge(self, tree):
+        """appends the entries of another database that are not in this one. Returns the number of entries appended."""
+        return len(filter(self.append, list(tree.getroot())))
+
+    def parse(self, filename):
+        """loads a file entry by entry, indexing the entries and storing their bodies aside as they are read"""
+        self.tree = etree.ElementTree(etree.Element("efrDb"))
+        self._reindex()
+        root = self.tree.getroot()
+        self._lock.acquire()
+        try:
+            for (event, entry) in etree.iterparse(filename, tag = "entry"):
+                entry.tail = None
+                self._index(entry)
+                root.append(entry)
+            listeners = list(self._listeners)
+        finally:
+            self._lock.release()
+        for (onEntry, onReload) in listeners:
+            if not onReload == None:
+                onReload()
+
+    def getroot(self):
+        return self.tree.getroot()
+
+    def xpath(self, *args, **kwargs):
+        return self.tree.xpath(*args, **kwargs)
+
@@ -13,16 +13,25 @@ THIS IS THE MAIN PROGRAM
 
 import sys
 import webbrowser
+import simplejson
 from PyQt4.QtCore import *
 from PyQt4.QtGui import *
 from PyQt4.QtWebKit import *
 from lxml import etree
 from lingpipe import LingPipeWarper
-import feedparser
 import infofinders
 from infofinders import loadXpathFunctions
 from dbbrowser import DbBrowser
-from tools import getFullUrl, escapeQuotesXml
+from dbaccess import DbAccess
+from entrybuilder import EntryBuilder
+from pipeline import IngestionPipeline
+from feedcache import FeedCache
+from scheduler import FeedScheduler
+from efrdb import EfrDb
+from renderer import PageRenderer
+from enrichment import EnrichmentLoader, enrichmentKeys
+from tools import getFullUrl
+from metrics import metrics, timed
 
 
 class EnhancedFeedReader(QMainWindow):
@@ -31,20 +40,24 @@ class EnhancedFeedReader(QMainWindow):
         QMainWindow.__init__(self)
 
         self._content = etree.ElementTree(etree.Element("content"))
-        self._output = etree.ElementTree(etree.Element("html"))      
+        self._output = ""
         # uses LingPipe to append entity tags to identified people, places, and organizations
-        self._lingPipeWarper = LingPipeWarper("lingpipe-3.8.2")
+        # a single LingPipe JVM is kept running for the whole session
+        self._lingPipeWarper = LingPipeWarper("lingpipe-3.8.2", server = True)
         self._currentPage = 0
-        self._efrDb = etree.ElementTree(etree.Element("efrDb"))
+        self._efrDb = EfrDb()
         self._displayedDb = self._efrDb
+        self._displayedTypes = self._efrDb.types
+        # the index of the entities used by the database browsers, updated as entries are appended or files loaded
+        self._dbAccess = DbAccess(self._efrDb)
         self._namespace = etree.FunctionNamespace('EnhancedFeedReader')
         
         # allows methods in this class to be called from an XSL template
         loadXpathFunctions([infofinders.getRealName, infofinders.getLocationCoordinates, infofinders.getMapUrl, infofinders.getGoogleSearch, infofinders.getTweets, getFullUrl], self._namespace)
         
         # generate database
-        self.addToDb = etree.XSLT(etree.parse("dbbuilder.xsl"))
-        self.applyTemplate = etree.XSLT(etree.parse("template.xsl"))
+        self._entryBuilder = EntryBuilder()
+        self._renderer = PageRenderer(templatePath)
 
         # GUI  items
         self.setWindowTitle("Enhanced Feed Reader")        
@@ -55,6 +68,14 @@ class EnhancedFeedReader(QMainWindow):
         loadFeedEntry = QAction("Load feed...", self)
         menu.addAction(loadFeedEntry)
         QObject.connect(loadFeedEntry, SIGNAL("triggered()"), self.readFeed)
+
+        subscribeEntry = QAction("Subscribe to feed...", self)
+        menu.addAction(subscribeEntry)
+        QObject.connect(subscribeEntry, SIGNAL("triggered()"), self.subscribe)
+
+        unsubscribeEntry = QAction("Unsubscribe from feed...", self)
+        menu.addAction(unsubscribeEntry)
+        QObject.connect(unsubscribeEntry, SIGNAL("triggered()"), self.unsubscribe)
         
         saveFeedEntry = QAction("Save entity database...", self)
         menu.addAction(saveFeedEntry)
@@ -63,11 +84,23 @@ class EnhancedFeedReader(QMainWindow):
         loadFeedEntry = QAction("Load entity database...", self)
         menu.addAction(loadFeedEntry)
         QObject.connect(loadFeedEntry, SIGNAL("triggered()"), self.loadDb)
+
+        mergeDbEntry = QAction("Merge entity database...", self)
+        menu.addAction(mergeDbEntry)
+        QObject.connect(mergeDbEntry, SIGNAL("triggered()"), self.mergeDb)
         
         exportPageEntry = QAction("Export current page...", self)
         menu.addAction(exportPageEntry)
         QObject.connect(exportPageEntry, SIGNAL("triggered()"), self.exportPage)        
 
+        showMetricsEntry = QAction("Show statistics", self)
+        menu.addAction(showMetricsEntry)
+        QObject.connect(showMetricsEntry, SIGNAL("triggered()"), self.showMetrics)
+
+        saveMetricsEntry = QAction("Save statistics...", self)
+        menu.addAction(saveMetricsEntry)
+        QObject.connect(saveMetricsEntry, SIGNAL("triggered()"), self.saveMetrics)
+
         centralWidget = QWidget()
         self.setCentralWidget(centralWidget)
 
@@ -92,12 +125,35 @@ class EnhancedFeedReader(QMainWindow):
         self._display = QWebView()
         self._display.page().setLinkDelegationPolicy(QWebPage.DelegateAllLinks)
         QObject.connect(self._display, SIGNAL("linkClicked (const QUrl&)"), self.openLink)
+        QObject.connect(self._display, SIGNAL("loadFinished(bool)"), self.pageLoaded)
         
         layout.addWidget(self._display)
         layout.addLayout(buttonLayout)
         
         #end GUI items
 
+        # feeds are ingested in background threads, entries are committed to the database from the GUI thread
+        self._pipeline = IngestionPipeline(self._entryBuilder, [self._lingPipeWarper], self.entryBuilt, self.ingestionProgress, self.feedLoaded, feedCache = FeedCache(), isKnown = self._efrDb.contains)
+        QObject.connect(self, SIGNAL("entryBuilt(PyQt_PyObject)"), self.commitEntry, Qt.QueuedConnection)
+        QObject.connect(self, SIGNAL("ingestionProgress(int, int)"), self.showProgress, Qt.QueuedConnection)
+        QObject.connect(self, SIGNAL("feedUnchanged()"), self.showUnchanged, Qt.QueuedConnection)
+
+        # subscribed feeds are polled in the background and their new entries go through the same pipeline
+        self._scheduler = FeedScheduler(self._pipeline, "subscriptions.json")
+        self._scheduler.start()
+
+        # tweets and searches are fetched in background threads and inserted in the displayed page when they arrive
+        self._enrichments = EnrichmentLoader(self.enrichmentLoaded)
+        self._pageEnrichments = []
+        self._pageLoaded = False
+        QObject.connect(self, SIGNAL("enrichmentLoaded(PyQt_PyObject, PyQt_PyObject)"), self.fillEnrichment, Qt.QueuedConnection)
+
+    def closeEvent(self, event):
+        self._scheduler.stop()
+        self._lingPipeWarper.close()
+        self._efrDb.close()
+        QMainWindow.closeEvent(self, event)
+
     def openLink(self, link):
         """ opens a link to one's default web browser """
         if link.scheme() == "efr":
@@ -105,7 +161,7 @@ class EnhancedFeedReader(QMainWindow):
             for (type, name) in  link.queryItems():
                 if not unicode(name) == "":
                     entities.append((unicode(type), unicode(name)))
-            dbBrowser = DbBrowser(self._efrDb, self, entities)
+            dbBrowser = DbBrowser(self._dbAccess, self, entities)
             dbBrowser.show()
         else:
             webbrowser.open(link.toString())
@@ -125,75 +181,184 @@ class EnhancedFeedReader(QMainWindow):
     def setDb(self, db = None):
         if db == None:
             self._displayedDb = self._efrDb
+            self._displayedTypes = self._efrDb.types
         else:
             self._displayedDb = db
+            self._displayedTypes = []
+            for type in db.xpath("/efrDb/entry/head/entity/@type"):
+                if not type in self._displayedTypes:
+                    self._displayedTypes.append(str(type))
         self._currentPage = 0
         self.refresh()
 
     def setDisplay(self, htmlTree):
+        self._pageEnrichments = []
         self._display.setHtml(etree.tostring(htmlTree, encoding = "UTF-8"))
 
     def setDisplayUrl(self, url):
+            self._pageEnrichments = []
             self._display.setUrl(QUrl(url))
 
+    @timed("gui.refresh")
     def refresh(self):
         start = self._currentPage * self._feedsPerPageBox.value()
         end = (self._currentPage + 1) * self._feedsPerPageBox.value()
-        self._output = self.applyTemplate(self._displayedDb, start = str(start), end = str(end))
-        self._display.setHtml(etree.tostring(self._output, encoding = "UTF-8"))
+        entries = self._displayedDb.getroot()[start:end]
+        # only the entries of the page are rendered, unless the page is already cached. Tweets and searches are left as placeholders.
+        self._output = self._renderer.render(entries, start, self._displayedTypes, self._efrDb.withBodies)
+        self._pageEnrichments = enrichmentKeys(entries)
+        self._enrichments.request(self._pageEnrichments)
+        # prefetches the enrichments of the next page while this one is read
+        self._enrichments.request(enrichmentKeys(self._displayedDb.getroot()[end:2 * end - start]))
+        self._pageLoaded = False
+        self._display.setHtml(self._output)
+
+    def pageLoaded(self, ok):
+        """fills the placeholders of the enrichments already fetched"""
+        self._pageLoaded = True
+        for key in self._pageEnrichments:
+            html = self._enrichments.get(key)
+            if not html == None:
+                self.fillEnrichment(key, html)
+
+    def enrichmentLoaded(self, key, html):
+        """called by the enrichment workers"""
+        self.emit(SIGNAL("enrichmentLoaded(PyQt_PyObject, PyQt_PyObject)"), key, html)
+
+    def fillEnrichment(self, key, html):
+        if self._pageLoaded and key in self._pageEnrichments:
+            self._display.page().mainFrame().evaluateJavaScript("fillEnrichment(%s, %s)" % (simplejson.dumps(key), simplejson.dumps(html)))
 
 
     def readFeed(self):
-        """reads a feed from a URL and extracts title, link, date, and summary using feedparser. It also includes a progress bar during the loading process."""
+        """reads a feed from a URL. Its entries are extracted with feedparser, annotated and added to the database in the background, and displayed as they arrive."""
         url, ok = QInputDialog.getText(self, "Load feed", "Enter feed URL:")
         if ok:
-            status = QProgressDialog("Loading enhanced feed...", "", 0, 100, self, Qt.SplashScreen)
-            status.setCancelButton(None)
-            status.setValue(1)
-            feed = feedparser.parse(str(url))
-            n = len(feed.entries)
-            i = 0
-            for feedEntry in feed.entries:
-                status.setValue(i * 100. / n)
-                self.newEntry(feedEntry.title, feedEntry.link, feedEntry.date, feedEntry.summary)
-                i += 1
-            status.setValue(100)
-            self.refresh()
+            metrics.count("gui.feedsRequested")
+            self.statusBar().showMessage("Loading enhanced feed...")
+            self._pipeline.submitFeed(str(url))
+
+    def subscribe(self):
+        """adds a feed to the subscriptions, its entries are then loaded without asking"""
+        url, ok = QInputDialog.getText(self, "Subscribe to feed", "Enter feed URL:")
+        if ok and not str(url) == "":
+            self.statusBar().showMessage("Loading enhanced feed...")
+            self._scheduler.subscribe(str(url))
+
+    def unsubscribe(self):
+        subscriptions = self._scheduler.subscriptions()
+        if len(subscriptions) == 0:
+            self.statusBar().showMessage("No subscriptions", 5000)
+            return
+        url, ok = QInputDialog.getItem(self, "Unsubscribe from feed", "Feed:", subscriptions, 0, False)
+        if ok:
+            self._scheduler.unsubscribe(str(url))
+
+    def entryBuilt(self, entry):
+        """called by the ingestion workers"""
+        self.emit(SIGNAL("entryBuilt(PyQt_PyObject)"), entry)
+
+    def ingestionProgress(self, done, total):
+        """called by the ingestion workers"""
+        self.emit(SIGNAL("ingestionProgress(int, int)"), done, total)
+
+    def feedLoaded(self, feedStats):
+        """called by the ingestion workers"""
+        self._scheduler.feedDone(feedStats)
+        # polls of the subscriptions are not reported
+        if feedStats.unchanged and not feedStats.url in self._scheduler.subscriptions():
+            self.emit(SIGNAL("feedUnchanged()"))
+
+    def showUnchanged(self):
+        self.statusBar().showMessage("The feed has not changed since it was last loaded", 5000)
+
+    def showProgress(self, done, total):
+        if done < total:
+            self.statusBar().showMessage("Loading enhanced feed... %d/%d entries" % (done, total))
+        else:
+            self.statusBar().showMessage("%d entries loaded" % total, 5000)
+
+    def commitEntry(self, entry):
+        """appends an entry built by the pipeline to the database and refreshes the view if the entry is on the current page"""
+        if self._efrDb.append(entry):
+            print entry.get("title").encode("utf-8")
+            if self._displayedDb == self._efrDb and len(self._efrDb.getroot()) <= (self._currentPage + 1) * self._feedsPerPageBox.value():
+                self.refresh()
 
 
     def loadDb(self):
         """load a LingPipe parsed xml file"""
         filename = QFileDialog.getOpenFileName(self)
         if not filename == "":
-            self._efrDb.parse(str(filename))
+            # new entries are journaled next to the loaded file
+            self._efrDb.load(str(filename))
+            self._displayedTypes = self._efrDb.types
+            self._pipeline.forget()
+            self.refresh()
+
+    def mergeDb(self):
+        """add the entries of another entity database that are not already loaded"""
+        filename = QFileDialog.getOpenFileName(self)
+        if not filename == "":
+            n = self._efrDb.merge(etree.parse(str(filename)))
+            self.statusBar().showMessage("%d entries merged" % n, 5000)
             self.refresh()
 
     def saveDb(self):
-        """Save a LingPipe parsed file as xml"""
+        """Save a LingPipe parsed file as xml. New entries are then journaled next to it as they arrive."""
         filename = QFileDialog.getSaveFileName(self)
         if not filename == "":
-            savedDb = open(filename, "w")
-            self._efrDb.write(savedDb, encoding = "UTF-8", xml_declaration = True)
-            savedDb.close()
+            self._efrDb.save(str(filename))
 
 
     def exportPage(self):
         """save feed reader display (with enhanced elements) as HTML"""
         filename = QFileDialog.getSaveFileName(self)
         if not filename == "":
+            # the exported page has its enrichments in place of the placeholders
+            start = self._currentPage * self._feedsPerPageBox.value()
+            end = (self._currentPage + 1) * self._feedsPerPageBox.value()
             savedPage = open(filename, "w")
-            self._output.write(savedPage, encoding = "UTF-8")
+            savedPage.write(self._renderer.render(self._displayedDb.getroot()[start:end], start, self._displayedTypes, self._efrDb.withBodies, False))
             savedPage.close()
 
 
+    def showMetrics(self):
+        """shows the time spent in each stage, the call counts and the cache hit ratios"""
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Statistics")
+        layout = QVBoxLayout()
+        dialog.setLayout(layout)
+        report = QTextEdit()
+        report.setReadOnly(True)
+        report.setFont(QFont("Courier"))
+        report.setPlainText(metrics.report())
+        layout.addWidget(report)
+        dialog.resize(800, 500)
+        dialog.show()
+
+    def saveMetrics(self):
+        """saves the statistics, as JSON if the file name ends with .json, else as a text report"""
+        filename = QFileDialog.getSaveFileName(self)
+        if not filename == "":
+            metrics.save(str(filename))
+
+
+    def hasEntry(self, link, guid = None):
+        """checks whether an entry with the given link is already in the database"""
+        return self._efrDb.contains(link, guid)
+
+    @timed("gui.newEntry")
     def newEntry(self, title, link, date, summary):
         """create a new feed entry"""
-        xpathQuery = u"count(/efrDb/entry[@link = '%s']) > 0" % link
-        if not self._efrDb.xpath(xpathQuery):
+        if not self.hasEntry(link):
             lingPipeOutput = etree.fromstring(self._lingPipeWarper.parseNamedEntities(unicode(summary), "text/html"), etree.HTMLParser())
-            print title.encode("utf-8")
-            entry = self.addToDb(lingPipeOutput, title = "\"%s\"" % escapeQuotesXml(title), link = "\"%s\"" % escapeQuotesXml(link), date = "\"%s\"" % escapeQuotesXml(date))
-            self._efrDb.getroot().append(entry.getroot())
+            self.addEntry(lingPipeOutput, title, link, date)
+
+    def addEntry(self, lingPipeOutput, title, link, date):
+        """builds an entry from a document parsed by LingPipe and appends it to the database"""
+        print title.encode("utf-8")
+        self._efrDb.append(self._entryBuilder.build(lingPipeOutput, title, link, date))
 
 
 
@@ -0,0 +1,80 @@
+'''
+Web 2.0 & Mobile Interaction -- Final Project
+December 4, 2009
+
+Olivier Jais-Nielsen (s090763)
+Andrea Lai (s091088)
+
+The Enhanced Feed Reader uses latent semantic analysis to identify people, organizations, and places within an RSS feed and pull in relevant additional content (Google Maps, Google Search, and recent tweets) for display.
+
+
+enrichment.py fetches the extra content displayed next to the entries (tweets, Google searches) in the background
+'''
+
+import threading
+from lxml import etree
+import infofinders
+from workers import WorkerPool
+
+PROVIDERS = {"getTweets": infofinders.getTweets, "getGoogleSearch": infofinders.getGoogleSearch}
+
+
+def enrichmentKeys(entries):
+    """returns the keys ("provider/query") of the enrichments displayed with some entries, as template.xsl names its placeholders"""
+    keys = []
+    for entity in [entity for entry in entries for entity in entry.xpath("head/entity")]:
+        if entity.get("type") == "PERSON":
+            key = u"getTweets/" + (entity.text or u"")
+        elif entity.get("type") == "LOCATION":
+            continue
+        else:
+            key = u"getGoogleSearch/" + (entity.text or u"")
+        if not key in keys:
+            keys.append(key)
+    return keys
+
+
+class EnrichmentLoader:
+    """
+    Fetches enrichments concurrently. The responses are kept by infofinders.responseCache, so stale ones are shown at once and refreshed in the background.
+    onResult(key, html) is called from the worker threads when an enrichment arrives (html is empty if it could not be fetched).
+    """
+
+    def __init__(self, onResult, workers = 4):
+        self._onResult = onResult
+        self._pool = WorkerPool(workers, 0, "enrichment", True)
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """returns the HTML of an enrichment, or None if it has not been fetched yet"""
+        (provider, query) = key.split(u"/", 1)
+        cached = infofinders.responseCache.peek(provider, query)
+        if cached == None:
+            return None
+        return etree.tostring(etree.fromstring(cached[0]), encoding = unicode)
+
+    def request(self, keys):
+        """starts fetching the enrichments that are neither fresh nor being fetched"""
+        self._lock.acquire()
+        try:
+            for key in keys:
+                (provider, query) = key.split(u"/", 1)
+                cached = infofinders.responseCache.peek(provider, query)
+                if (cached == None or not cached[1]) and not key in self._pending:
+                    self._pending.add(key)
+                    self._pool.submit(self._fetch, key)
+        finally:
+            self._lock.release()
+
+    def _fetch(self, key):
+        (provider, query) = key.split(u"/", 1)
+        html = u""
+        try:
+            html = etree.tostring(PROVIDERS[provider](None, query), encoding = unicode)
+        finally:
+            # failures are not kept, so they are fetched again with the next display
+            self._lock.acquire()
+            self._pending.discard(key)
+            self._lock.release()
+            self._onResult(key, html)
@@ -0,0 +1,104 @@
+'''
+Web 2.0 & Mobile Interaction -- Final Project
+December 4, 2009
+
+Olivier Jais-Nielsen (s090763)
+Andrea Lai (s091088)
+
+The Enhanced Feed Reader uses latent semantic analysis to identify people, organizations, and places within an RSS feed and pull in relevant additional content (Google Maps, Google Search, and recent tweets) for display.
+
+
+entrybuilder.py turns the documents annotated by LingPipe into entries of the entity database
+'''
+
+from lxml import etree
+import infofinders
+from tools import escapeQuotesXml
+from workers import WorkerPool
+from metrics import timed
+
+# the namespaces dbbuilder.xsl used to declare on the entries it built
+ENTRY_NAMESPACES = {"efr": "EnhancedFeedReader", "set": "http://exslt.org/sets"}
+
+
+class EntryBuilder:
+    """
+    Builds the entries from LingPipe documents, as dbbuilder.xsl used to.
+    The distinct mentions of a document are collected once and those missing from the resolver cache are resolved together on a pool of threads,
+    so entries can be built concurrently and each name only crosses the network once per document.
+    """
+
+    def __init__(self, resolveWorkers = 8):
+        self._pool = WorkerPool(resolveWorkers, 0, "resolver")
+
+    def _resolve(self, kind, function, inputs):
+        """returns a dictionary of the results of function(None, input), fetching the uncached ones in parallel"""
+        results = infofinders.resolverCache.getMany(kind, inputs)
+        missing = [input for input in inputs if not input in results]
+        results.update(zip(missing, self._pool.map(lambda input: function(None, input), missing)))
+        return results
+
+    def _copy(self, node, realNames):
+        """returns the copy of a node of the LingPipe document made for the entry body"""
+        if node.tag is etree.Comment:
+            copy = etree.Comment(node.text)
+        elif node.tag is etree.ProcessingInstruction:
+            copy = etree.ProcessingInstruction(node.target, node.text)
+        else:
+            if node.tag == "body":
+                copy = etree.Element("body")
+            elif node.tag == "enamex":
+                copy = etree.Element("span")
+                copy.set("class", "ENTITY " + node.get("type", ""))
+                copy.set("title", realNames[node.xpath("string(.)")])
+            elif node.tag == "s":
+                copy = etree.Element("span")
+                copy.set("class", "SENTENCE")
+            else:
+                copy = etree.Element(node.tag)
+                for (name, value) in node.items():
+                    copy.set(name, value)
+            copy.text = node.text
+            for child in node:
+                copy.append(self._copy(child, realNames))
+        copy.tail = node.tail
+        return copy
+
+    @timed("entrybuilder.build")
+    def build(self, lingPipeOutput, title, link, date, guid = ""):
+        """returns the <entry> element built from a parsed LingPipe document (a tree or its root). guid is the id given to the entry by its feed, if any."""
+        html = lingPipeOutput
+        if hasattr(html, "getroot"):
+            html = html.getroot()
+        entry = etree.Element("entry", nsmap = ENTRY_NAMESPACES)
+        entry.set("title", escapeQuotesXml(title))
+        entry.set("link", escapeQuotesXml(link))
+        entry.set("date", escapeQuotesXml(date))
+        if not guid == "":
+            entry.set("guid", escapeQuotesXml(guid))
+
+        # distinct mentions, with the type of their first occurrence
+        mentions = []
+        types = {}
+        for enamex in html.iter("enamex"):
+            mention = enamex.xpath("string(.)")
+            if not mention in types:
+                mentions.append(mention)
+                types[mention] = enamex.get("type", "")
+        realNames = self._resolve("realName", infofinders.getRealName, mentions)
+        locations = [realNames[mention] for mention in mentions if types[mention] == "LOCATION" and not realNames[mention] == ""]
+        coordinates = dict(zip(locations, infofinders.getLocationsCoordinates(locations, self._pool.map)))
+
+        head = etree.SubElement(entry, "head")
+        for mention in mentions:
+            realName = realNames[mention]
+            if not realName == "":
+                entity = etree.SubElement(head, "entity")
+                entity.set("type", types[mention])
+                if types[mention] == "LOCATION":
+                    entity.set("coordinates", coordinates[realName])
+                entity.text = realName
+        head.tail = html.text
+        for child in html:
+            entry.append(self._copy(child, realNames))
+        return entry
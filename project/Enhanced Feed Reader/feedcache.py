@@ -0,0 +1,111 @@
+'''
+Web 2.0 & Mobile Interaction -- Final Project
+December 4, 2009
+
+Olivier Jais-Nielsen (s090763)
+Andrea Lai (s091088)
+
+The Enhanced Feed Reader uses latent semantic analysis to identify people, organizations, and places within an RSS feed and pull in relevant additional content (Google Maps, Google Search, and recent tweets) for display.
+
+
+feedcache.py fetches feeds with conditional requests and only parses them when they have changed
+'''
+
+import os
+import threading
+import hashlib
+import urllib
+import urllib2
+import urlparse
+import feedparser
+import simplejson
+
+
+class FeedCache:
+    """
+    Remembers the ETag, Last-Modified date and content hash of every fetched feed.
+    fetch() sends conditional requests and returns None when the feed has not changed (304 or identical content).
+    The validators of a fetch are only kept once commit() is called, when the entries of the feed have all been ingested:
+    until then, a crash leaves the feed to be parsed again instead of passing it as unchanged.
+    If a path is given the cache can be saved there. It should live next to the database the feeds are ingested into, and be saved after it.
+    """
+
+    def __init__(self, path = None):
+        self._path = path
+        self._lock = threading.Lock()
+        self._feeds = {}
+        # validators fetched but not yet committed
+        self._pending = {}
+        if not path == None and os.path.exists(path):
+            cacheFile = open(path)
+            self._feeds = simplejson.load(cacheFile)
+            cacheFile.close()
+
+    def clear(self):
+        self._lock.acquire()
+        self._feeds = {}
+        self._pending = {}
+        self._lock.release()
+
+    def save(self):
+        if not self._path == None:
+            self._lock.acquire()
+            try:
+                cacheFile = open(self._path, "w")
+                simplejson.dump(self._feeds, cacheFile)
+                cacheFile.close()
+            finally:
+                self._lock.release()
+
+    def _download(self, url, state):
+        """returns the body of the feed and its validators, or None if the server answers 304"""
+        if not "://" in url or url.startswith("file:"):
+            if url.startswith("file:"):
+                url = urllib.url2pathname(urlparse.urlsplit(url).path)
+            return (open(url, "rb").read(), None, None)
+        request = urllib2.Request(url, None, {"User-agent": "Mozilla/5.0"})
+        if state.get("etag"):
+            request.add_header("If-None-Match", state["etag"])
+        if state.get("modified"):
+            request.add_header("If-Modified-Since", state["modified"])
+        try:
+            response = urllib2.urlopen(request)
+        except urllib2.HTTPError, e:
+            if e.code == 304:
+                return None
+            raise
+        body = response.read()
+        response.close()
+        return (body, response.info().getheader("ETag"), response.info().getheader("Last-Modified"))
+
+    def fetch(self, url):
+        """returns the parsed feed, or None if it has not changed since the last committed fetch"""
+        self._lock.acquire()
+        state = self._feeds.get(url, {})
+        self._lock.release()
+        download = self._download(url, state)
+        if download == None:
+            return None
+        (body, etag, modified) = download
+        contentHash = hashlib.sha1(body).hexdigest()
+        unchanged = contentHash == state.get("hash")
+        self._lock.acquire()
+        self._pending[url] = {"etag": etag, "modified": modified, "hash": contentHash}
+        self._lock.release()
+        if unchanged:
+            return None
+        return feedparser.parse(body)
+
+    def commit(self, url):
+        """keeps the validators of the last fetch of a feed, once all its entries have been ingested"""
+        self._lock.acquire()
+        if url in self._pending:
+            self._feeds[url] = self._pending.pop(url)
+        self._lock.release()
+
+    def invalidate(self, url):
+        """forces the next fetch of a feed to parse it, e.g. when some of its entries could not be ingested"""
+        self._lock.acquire()
+        self._feeds.pop(url, None)
+        self._pending.pop(url, None)
+        self._lock.release()
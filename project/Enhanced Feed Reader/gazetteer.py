@@ -0,0 +1,96 @@
+'''
+Web 2.0 & Mobile Interaction -- Final Project
+December 4, 2009
+
+Olivier Jais-Nielsen (s090763)
+Andrea Lai (s091088)
+
+The Enhanced Feed Reader uses latent semantic analysis to identify people, organizations, and places within an RSS feed and pull in relevant additional content (Google Maps, Google Search, and recent tweets) for display.
+
+
+gazetteer.py geocodes place names offline, with an index built from a GeoNames dump (e.g. http://download.geonames.org/export/dump/cities1000.zip).
+Usage: python gazetteer.py [-m min-population] cities1000.txt geonames.idx
+'''
+
+import re
+import sys
+from optparse import OptionParser
+from sortedindex import buildIndex, SortedIndex
+
+# columns of the GeoNames dump files
+NAME = 1
+ASCII_NAME = 2
+ALTERNATE_NAMES = 3
+LATITUDE = 4
+LONGITUDE = 5
+COUNTRY = 8
+POPULATION = 14
+
+
+def foldName(name):
+    """returns the form of a place name used as key: lower case, with single spaces"""
+    if not isinstance(name, unicode):
+        name = name.decode("utf-8")
+    return re.sub(r"\s+", " ", name).strip().lower()
+
+def _gazetteerPairs(geonamesPath, minPopulation):
+    for line in open(geonamesPath, "rb"):
+        fields = line.rstrip("\r\n").decode("utf-8").split("\t")
+        if len(fields) <= POPULATION or not fields[POPULATION].isdigit() or int(fields[POPULATION]) < minPopulation:
+            continue
+        place = u"\t".join([fields[POPULATION], fields[LATITUDE], fields[LONGITUDE], fields[NAME], fields[COUNTRY]])
+        names = set([foldName(fields[NAME]), foldName(fields[ASCII_NAME])])
+        names.update([foldName(name) for name in fields[ALTERNATE_NAMES].split(",")])
+        for name in names:
+            if not name == "":
+                yield (name, place)
+
+def buildGazetteer(path, geonamesPath, minPopulation = 0):
+    """builds the index of a GeoNames dump, keyed by the names, ascii names and alternate names of the places"""
+    buildIndex(path, _gazetteerPairs(geonamesPath, minPopulation))
+
+
+class Gazetteer:
+    """
+    A geocoder looking places up in an index built by buildGazetteer. When several places have the same name, the most populated one is chosen.
+    geocode returns (place, (latitude, longitude)) like the geopy geocoders, or None if the name is unknown.
+    """
+
+    def __init__(self, path):
+        self._index = SortedIndex(path)
+
+    def _best(self, values):
+        """returns the most populated of the places of some index values"""
+        best = None
+        for value in values:
+            (population, latitude, longitude, place, country) = value.split("\t")
+            if best == None or int(population) > best[0]:
+                best = (int(population), u"%s, %s" % (place, country), (float(latitude), float(longitude)))
+        if best == None:
+            return None
+        return best[1:]
+
+    def geocode(self, name):
+        return self._best(self._index.get(foldName(name)))
+
+    def geocodeAll(self, names):
+        """geocodes a list of names, returning the list of the results. The names are looked up together in a single pass over the index."""
+        keys = [foldName(name) for name in names]
+        values = self._index.getMany(keys)
+        return [self._best(values[key]) for key in keys]
+
+    def close(self):
+        self._index.close()
+
+
+def main(argv):
+    parser = OptionParser(usage = "usage: %prog [options] geonames-dump index-file")
+    parser.add_option("-m", "--min-population", type = "int", default = 0, help = "places with fewer inhabitants are left out [%default]")
+    (options, args) = parser.parse_args(argv)
+    if not len(args) == 2:
+        parser.error("a GeoNames dump and an index file must be given")
+    buildGazetteer(args[1], args[0], options.min_population)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,205 @@
+'''
+Web 2.0 & Mobile Interaction -- Final Project
+December 4, 2009
+
+Olivier Jais-Nielsen (s090763)
+Andrea Lai (s091088)
+
+The Enhanced Feed Reader uses latent semantic analysis to identify people, organizations, and places within an RSS feed and pull in relevant additional content (Google Maps, Google Search, and recent tweets) for display.
+
+
+httppool.py keeps the HTTP connections to the web services open between requests
+'''
+
+import time
+import zlib
+import socket
+import httplib
+import urlparse
+import threading
+
+REDIRECTS = (301, 302, 303, 307)
+RETRIED = (500, 502, 503, 504)
+
+
+class HttpError(Exception):
+    """An error status returned by a server"""
+
+    def __init__(self, url, status, reason):
+        Exception.__init__(self, "%s: %d %s" % (url, status, reason))
+        self.url = url
+        self.status = status
+
+
+class HttpResponse:
+    """A response read in full: status, headers (lower case names), decompressed body and final url (after redirects)"""
+
+    def __init__(self, url, status, reason, headers, body):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+
+class HostStats:
+    """Counts of the requests made to a host and their latency"""
+
+    def __init__(self):
+        self.requests = 0
+        self.connections = 0
+        self.reused = 0
+        self.retries = 0
+        self.errors = 0
+        self.totalTime = 0.
+        self.maxTime = 0.
+
+    def averageTime(self):
+        if self.requests == 0:
+            return 0.
+        return self.totalTime / self.requests
+
+    def asDict(self):
+        return {"requests": self.requests, "connections": self.connections, "reused": self.reused, "retries": self.retries,
+                "errors": self.errors, "averageTime": self.averageTime(), "maxTime": self.maxTime}
+
+
+class HttpPool:
+    """
+    Thread-safe pool of keep-alive connections, at most maxPerHost used at the same time for each host (callers wait for a free one).
+    Requests ask for gzip content, follow redirects, and are retried with an exponential backoff on connection errors and 5xx statuses.
+    A kept-alive connection closed by the server is reopened at once, without counting as a retry.
+    """
+
+    def __init__(self, maxPerHost = 4, timeout = 10, retries = 2, backoff = 0.5, userAgent = "Mozilla/5.0"):
+        self._maxPerHost = maxPerHost
+        self._timeout = timeout
+        self._retries = retries
+        self._backoff = backoff
+        self._userAgent = userAgent
+        self._idle = {}
+        self._slots = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _host(self, key):
+        """returns the idle connections, the semaphore and the stats of a host, creating them if needed"""
+        self._lock.acquire()
+        try:
+            if not key in self._slots:
+                self._idle[key] = []
+                self._slots[key] = threading.BoundedSemaphore(self._maxPerHost)
+                self._stats[key[1]] = HostStats()
+            return (self._idle[key], self._slots[key], self._stats[key[1]])
+        finally:
+            self._lock.release()
+
+    def _connect(self, key):
+        (scheme, host) = key
+        if scheme == "https":
+            return httplib.HTTPSConnection(host, timeout = self._timeout)
+        return httplib.HTTPConnection(host, timeout = self._timeout)
+
+    def _send(self, key, method, path, body, headers):
+        """sends a request on an idle connection of the host (or a new one), returns (status, reason, headers, body)"""
+        (idle, slots, stats) = self._host(key)
+        slots.acquire()
+        try:
+            attempt = 0
+            while True:
+                self._lock.acquire()
+                reused = len(idle) > 0
+                if reused:
+                    connection = idle.pop()
+                else:
+                    connection = self._connect(key)
+                    stats.connections += 1
+                self._lock.release()
+                started = time.time()
+                try:
+                    connection.request(method, path, body, headers)
+                    response = connection.getresponse()
+                    data = response.read()
+                except (socket.error, httplib.HTTPException):
+                    connection.close()
+                    if reused:
+                        continue
+                    self._lock.acquire()
+                    if attempt >= self._retries:
+                        stats.errors += 1
+                    else:
+                        stats.retries += 1
+                    self._lock.release()
+                    if attempt >= self._retries:
+                        raise
+                    time.sleep(self._backoff * 2 ** attempt)
+                    attempt += 1
+                    continue
+                elapsed = time.time() - started
+                self._lock.acquire()
+                stats.requests += 1
+                stats.totalTime += elapsed
+                stats.maxTime = max(stats.maxTime, elapsed)
+                if reused:
+                    stats.reused += 1
+                if response.will_close:
+                    connection.close()
+                else:
+                    idle.append(connection)
+                self._lock.release()
+                if response.status in RETRIED and attempt < self._retries:
+                    self._lock.acquire()
+                    stats.retries += 1
+                    self._lock.release()
+                    time.sleep(self._backoff * 2 ** attempt)
+                    attempt += 1
+                    continue
+                return (response.status, response.reason, dict(response.getheaders()), data)
+        finally:
+            slots.release()
+
+    def request(self, method, url, body = None, headers = {}, redirects = 5):
+        """makes a request and returns the HttpResponse, raising HttpError for error statuses"""
+        allHeaders = {"User-Agent": self._userAgent, "Accept-Encoding": "gzip, deflate"}
+        allHeaders.update(headers)
+        if not body == None:
+            allHeaders.setdefault("Content-Type", "application/x-www-form-urlencoded")
+        (scheme, host, path, query, fragment) = urlparse.urlsplit(url)
+        if not query == "":
+            path += "?" + query
+        (status, reason, responseHeaders, data) = self._send((scheme, host), method, path or "/", body, allHeaders)
+        if status in REDIRECTS and "location" in responseHeaders and redirects > 0:
+            location = urlparse.urljoin(url, responseHeaders["location"])
+            if status == 307:
+                return self.request(method, location, body, headers, redirects - 1)
+            return self.request("GET", location, None, headers, redirects - 1)
+        if status >= 400:
+            raise HttpError(url, status, reason)
+        encoding = responseHeaders.get("content-encoding", "")
+        if encoding == "gzip":
+            data = zlib.decompress(data, 16 + zlib.MAX_WBITS)
+        elif encoding == "deflate":
+            data = zlib.decompress(data)
+        return HttpResponse(url, status, reason, responseHeaders, data)
+
+    def get(self, url, headers = {}):
+        return self.request("GET", url, None, headers)
+
+    def post(self, url, data, headers = {}):
+        return self.request("POST", url, data, headers)
+
+    def stats(self):
+        """returns the stats of every host, as dictionaries"""
+        self._lock.acquire()
+        try:
+            return dict([(host, stats.asDict()) for (host, stats) in self._stats.items()])
+        finally:
+            self._lock.release()
+
+    def close(self):
+        self._lock.acquire()
+        for idle in self._idle.values():
+            for connection in idle:
+                connection.close()
+            del idle[:]
+        self._lock.release()
@@ -11,20 +11,47 @@ infofinders.py obtains the extra information for display alongside the RSS feed
 '''
 
 from lxml import etree
+import os
+import sys
+import threading
+import traceback
 import urllib
-import urllib2
+from StringIO import StringIO
 from geopy import geocoders
 import simplejson
 from tools import escapeQuotesXml
-try:
-	from twython import twython
-except ImportError:
-	import twython
-
-# initiaion for geopy -- requires Google maps API key
-geocoder = geocoders.Google("ABQIAAAAxGk5YmrjBWSHyDAwYYY-MhQ_1E-tD_iqbAxovATVDR2ADdA5xxSroItyCgyEHDdZPxGVbxq0dNYa-A")
-realNameCache = {}
-locationCoordinatesCache = {}
+from cache import PersistentCache, ResponseCache, DAY
+from wikiindex import WikipediaIndex
+from gazetteer import Gazetteer
+from httppool import HttpPool
+from workers import SingleFlight
+from metrics import metrics, timed
+
+# geocoding uses the offline gazetteer (see gazetteer.py) if it has been built, else geopy -- which requires Google maps API key
+GAZETTEER = "geonames.idx"
+GOOGLE_MAPS_KEY = "ABQIAAAAxGk5YmrjBWSHyDAwYYY-MhQ_1E-tD_iqbAxovATVDR2ADdA5xxSroItyCgyEHDdZPxGVbxq0dNYa-A"
+geocoder = None
+geocoderLock = threading.Lock()
+# resolved names and coordinates are kept across sessions, and shared with the batch reader
+resolverCache = PersistentCache("efrcache.sqlite", {"realName": 30 * DAY, "coordinates": 180 * DAY}, negativeTtl = DAY)
+# offline index of the Wikipedia titles (see wikiindex.py), used before searching Wikipedia if it exists
+WIKIPEDIA_INDEX = "enwiki-titles.idx"
+wikipediaIndex = None
+wikipediaIndexRefused = False
+wikipediaIndexLock = threading.Lock()
+# the web services queried, which can be pointed at local stand-ins (see benchmark.py)
+WIKIPEDIA_SEARCH_URL = "http://en.wikipedia.org/w/index.php"
+GOOGLE_SEARCH_URL = "http://ajax.googleapis.com/ajax/services/search/web"
+TWITTER_SEARCH_URL = "http://search.twitter.com/search.json"
+# every request to the web services goes through these kept-alive connections
+httpPool = HttpPool(maxPerHost = 4, timeout = 10)
+# concurrent lookups of the same name wait for a single request
+flights = SingleFlight()
+# tweets and searches are refreshed in the background once they are 10 minutes old
+responseCache = ResponseCache(freshFor = 600)
+metrics.addSource("http", httpPool.stats)
+metrics.addSource("singleFlight", flights.stats)
+metrics.addSource("responseCache", responseCache.stats)
 
 def getMapUrl(context, input):
     """generates a Google map based on a search string"""
@@ -33,20 +60,33 @@ def getMapUrl(context, input):
     return url
 
 
-def getWikipediaBestMatch(name):
-    """searches Wikipedia for the best match to a given string. If none exists, the string is not identified as an entity."""
+def getWikipediaIndex():
+    """returns the offline index of the Wikipedia titles, or None if it has not been built (or was built without the redirects)"""
+    global wikipediaIndex, wikipediaIndexRefused
+    wikipediaIndexLock.acquire()
+    try:
+        if wikipediaIndex == None and not wikipediaIndexRefused and os.path.exists(WIKIPEDIA_INDEX):
+            try:
+                wikipediaIndex = WikipediaIndex(WIKIPEDIA_INDEX)
+            except ValueError, error:
+                sys.stderr.write("%s, searching Wikipedia instead\n" % error)
+                wikipediaIndexRefused = True
+        return wikipediaIndex
+    finally:
+        wikipediaIndexLock.release()
+
+@timed("infofinders.wikipediaSearch")
+def getWikipediaBestMatch(name, depth = 3):
+    """searches Wikipedia for the best match to a given string, following at most depth "did you mean" suggestions. If none exists, the string is not identified as an entity."""
     search = urllib.urlencode({"go": "Go", "search": name, "title": "Special:Search"})
-    opener = urllib2.build_opener()
-    opener.addheaders = [('User-agent', 'Mozilla/5.0')]
-    wikipediaSearch = opener.open("http://en.wikipedia.org/w/index.php", search)
-    result = etree.parse(wikipediaSearch, etree.HTMLParser())
-    wikipediaSearch.close()
+    wikipediaSearch = httpPool.post(WIKIPEDIA_SEARCH_URL, search)
+    result = etree.parse(StringIO(wikipediaSearch.body), etree.HTMLParser())
     noExactMatch = result.xpath("count(//*[@class = 'searchresults']) > 0")
     match = ""
     if noExactMatch:
         suggestion = result.xpath("//*[@class = 'searchdidyoumean']/descendant::em")
-        if (len(suggestion) > 0):
-            match = getWikipediaBestMatch(suggestion[0].text)
+        if (len(suggestion) > 0 and depth > 0):
+            match = getWikipediaBestMatch(suggestion[0].text, depth - 1)
     else:
         title = result.xpath("//title")
         try:
@@ -56,41 +96,96 @@ def getWikipediaBestMatch(name):
             pass
     return match
 
+@timed("infofinders.findRealName")
+def findRealName(name):
+    """looks a name up in the offline index, searching Wikipedia only if it is not there"""
+    index = getWikipediaIndex()
+    if not index == None:
+        match = index.lookup(name)
+        if not match == None:
+            return match
+    return getWikipediaBestMatch(name)
+
 def getRealName(context, input):
     """Takes the best match from Wikipedia as the real name of some input string, the tentative entity"""
-    global realNameCache
     if input.strip() == "":
         return ""
     else:
-        realNameCache.setdefault(input, escapeQuotesXml(getWikipediaBestMatch(input)))
-        return realNameCache[input]
+        return flights.do(("realName", input), resolverCache.lookup, "realName", input, lambda name: escapeQuotesXml(findRealName(name)))
+
+def setGeocoder(newGeocoder):
+    """replaces the geocoder: any object whose geocode(name) returns (place, (lat, lng)) or None, and optionally with a geocodeAll(names) returning a list of those"""
+    global geocoder
+    geocoder = newGeocoder
+
+def getGeocoder():
+    """returns the geocoder, creating the default one on first use"""
+    global geocoder
+    geocoderLock.acquire()
+    try:
+        if geocoder == None:
+            if os.path.exists(GAZETTEER):
+                geocoder = Gazetteer(GAZETTEER)
+            else:
+                geocoder = geocoders.Google(GOOGLE_MAPS_KEY)
+        return geocoder
+    finally:
+        geocoderLock.release()
+
+def formatCoordinates(result):
+    if result == None:
+        return ""
+    place, (lat, lng) = result
+    return "%s %s" %(lat, lng)
+
+@timed("infofinders.geocode")
+def geocode(input):
+    return formatCoordinates(getGeocoder().geocode(input))
 
 def getLocationCoordinates(context, input):
     """ obtains the precise location coordinates using GeoPy for similiarity analysis by spatial localization"""
-    global geocoder
-    global locationCoordinatesCache
-    if not input in locationCoordinatesCache.keys():
-        try:
-            place, (lat, lng) = geocoder.geocode(input)
-            locationCoordinatesCache[input] = "%s %s" %(lat, lng)
-        except:
-            locationCoordinatesCache[input] = ""
-    return locationCoordinatesCache[input]
+    return flights.do(("coordinates", input), resolverCache.lookup, "coordinates", input, geocode)
+
+def geocodeAll(keys):
+    """geocodes the locations of some ("coordinates", location) keys in one call and caches the results, as resolverCache.lookup does: "" for all of them if the call fails"""
+    inputs = [input for (kind, input) in keys]
+    try:
+        results = [formatCoordinates(result) for result in getGeocoder().geocodeAll(inputs)]
+    except Exception:
+        traceback.print_exc(file = sys.stderr)
+        results = [""] * len(inputs)
+    for (input, result) in zip(inputs, results):
+        metrics.hit("cache.coordinates", False)
+        resolverCache.put("coordinates", input, result)
+    return results
+
+@timed("infofinders.geocodeAll")
+def getLocationsCoordinates(inputs, map = map):
+    """geocodes the locations of a whole entry: the uncached ones in one call if the geocoder can, else each with getLocationCoordinates through map"""
+    results = resolverCache.getMany("coordinates", inputs)
+    missing = list(set([input for input in inputs if not input in results]))
+    if len(missing) > 0:
+        if hasattr(getGeocoder(), "geocodeAll"):
+            # the locations already being looked up by other entries are waited for rather than looked up again
+            results.update(zip(missing, flights.doMany([("coordinates", input) for input in missing], geocodeAll)))
+        else:
+            results.update(zip(missing, map(lambda input: getLocationCoordinates(None, input), missing)))
+    return [results[input] for input in inputs]
 
 def loadXpathFunctions(functions, namespace):
     for function in functions:
         namespace[function.__name__] = function
 
         
-def getGoogleSearch(context, input):
-    """Returns the top two Google Search results and their descriptions for a given input"""
+@timed("infofinders.googleSearch")
+def searchGoogle(input):
+    """Returns the markup of the top two Google Search results and their descriptions for a given input"""
     
     # search Google for the input string
     input = urllib.quote_plus(input)
-    url = ('http://ajax.googleapis.com/ajax/services/search/web?v=1.0&q=%s') % (input)
-    request = urllib2.Request(url, None, {'Referer': '/localhost/'})
-    response = urllib2.urlopen(request)
-    results = simplejson.load(response)
+    url = (GOOGLE_SEARCH_URL + '?v=1.0&q=%s') % (input)
+    response = httpPool.get(url, {'Referer': '/localhost/'})
+    results = simplejson.loads(response.body)
 
     result = '<div><br/>'
         
@@ -101,17 +196,22 @@ def getGoogleSearch(context, input):
         text = item["content"]
         result += link + title + text + '<br/><br/>'
     
+    return '%s <br/></div>' % (result)
+
+def getGoogleSearch(context, input):
+    """Returns the top two Google Search results and their descriptions for a given input"""
     # # result is formatted in html, read and displayed as such
-    html = etree.fromstring('%s <br/></div>' % (result))
+    html = etree.fromstring(responseCache.get("getGoogleSearch", input, lambda query: flights.do(("getGoogleSearch", query), searchGoogle, query)))
     return html
 
-def getTweets(context, input):
-    """Returns the first 3 tweets matching a given search string"""
+@timed("infofinders.twitterSearch")
+def searchTwitter(input):
+    """Returns the markup of the first 3 tweets matching a given search string"""
     
-    # search Twitter for tweets matching the input string
-    twitter = twython.setup()
+    # search Twitter for tweets matching the input string, as twython's searchTwitter did
     # take only the first 3 tweets
-    search_results = twitter.searchTwitter(input, rpp="3")
+    url = TWITTER_SEARCH_URL + "?" + urllib.urlencode({"q": input.encode("utf-8"), "rpp": "3"})
+    search_results = simplejson.loads(httpPool.get(url).body)
 
     result = '<div><br/>'
     for tweet in search_results["results"]:
@@ -119,8 +219,12 @@ def getTweets(context, input):
         tweet = "%s <br/>" % (tweet["text"])
         result += ref + tweet
 
+    return '%s<br/></div>' % (result)
+
+def getTweets(context, input):
+    """Returns the first 3 tweets matching a given search string"""
     # result is formatted in html, read and displayed as such
-    html = etree.fromstring('%s<br/></div>' % (result))
+    html = etree.fromstring(responseCache.get("getTweets", input, lambda query: flights.do(("getTweets", query), searchTwitter, query)))
     return html
 
 
@@ -129,6 +233,7 @@ if __name__ == "__main__":
     print getWikipediaBestMatch("obama")
     print getWikipediaBestMatch("obrama")
     print getWikipediaBestMatch("dzahdizqnjf,lengflmqeorigmq")
+    print metrics.report()
 
 
 
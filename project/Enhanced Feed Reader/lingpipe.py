@@ -5,7 +5,7 @@ December 4, 2009
 Olivier Jais-Nielsen (s090763)
 Andrea Lai (s091088)
 
-The Enhanced Feed Reader uses latent semantic analysis to identify people, organizations, and places within an RSS feed and pull in relevant additional content (Google Maps, Google Search, and recent tweets) for display. 
+The Enhanced Feed Reader uses latent semantic analysis to identify people, organizations, and places within an RSS feed and pull in relevant additional content (Google Maps, Google Search, and recent tweets) for display.
 
 
 lingpipe.py provides a wrapper class for LingPipe (otherwise, a java application) in Python
@@ -13,25 +13,183 @@ lingpipe.py provides a wrapper class for LingPipe (otherwise, a java application
 
 import os
 import subprocess
+import threading
+import shlex
+import copy
+import cgi
 import re
+from lxml import etree
+from metrics import metrics, timed
+
+SHELL_EXT = {"nt": "bat", "posix": "sh"}
+DEMO_COMMAND = "com.aliasi.demo.framework.DemoCommand"
+SERVER_CLASS = "NerServer"
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+BATCH_SEPARATOR = "<hr class=\"EFRSPLIT\"/>"
+
+
+class LingPipeError(Exception):
+    pass
+
+
+def readDemoCommand(scriptPath):
+    """extracts the java command line launched by one of LingPipe's generic demo scripts"""
+    script = open(scriptPath).read()
+    script = re.sub(r"[\\^][ \t]*\r?\n", " ", script)
+    for line in script.splitlines():
+        if DEMO_COMMAND in line:
+            command = [arg.strip("\"") for arg in shlex.split(line, posix = False)]
+            return [arg for arg in command if not arg in ("$@", "$*", "\"$@\"", "%*")]
+    raise LingPipeError("No LingPipe demo command found in %s" % scriptPath)
+
+
+def isSeparator(element):
+    return element.tag == "hr" and element.get("class") == "EFRSPLIT"
+
+def splitAtSeparators(element):
+    """splits a parsed document at each batch separator. The ancestors of a separator are copied into the parts on both of its sides."""
+    parts = [etree.Element(element.tag, dict(element.attrib))]
+    parts[0].text = element.text
+    for child in element:
+        if isSeparator(child):
+            parts.append(etree.Element(element.tag, dict(element.attrib)))
+            parts[-1].text = child.tail
+        elif isinstance(child.tag, basestring) and len(filter(isSeparator, child.iter("hr"))) > 0:
+            childParts = splitAtSeparators(child)
+            parts[-1].append(childParts[0])
+            for childPart in childParts[1:]:
+                parts.append(etree.Element(element.tag, dict(element.attrib)))
+                parts[-1].append(childPart)
+            childParts[-1].tail = child.tail
+        else:
+            parts[-1].append(copy.deepcopy(child))
+    return parts
+
+
+class LingPipeServer:
+    """Keeps a single LingPipe JVM (and its model) alive and talks to it with framed requests over a pipe. The JVM is restarted if it dies."""
+
+    def __init__(self, workingDir, scriptPath):
+        self._workingDir = workingDir
+        self._scriptPath = scriptPath
+        self._process = None
+        self._lock = threading.Lock()
+
+    def _command(self):
+        command = readDemoCommand(self._scriptPath)
+        i = command.index(DEMO_COMMAND)
+        command[i] = SERVER_CLASS
+        for option in ("-cp", "-classpath"):
+            if option in command[:i]:
+                j = command.index(option) + 1
+                classpath = command[j]
+                command[j] = classpath + os.pathsep + SERVER_DIR
+                self._compile(classpath)
+                return command + ["-outCharset=utf-8", "-inCharset=utf-8"]
+        raise LingPipeError("No classpath found in %s" % self._scriptPath)
+
+    def _compile(self, classpath):
+        """compiles NerServer.java against LingPipe's demo classpath if needed"""
+        source = os.path.join(SERVER_DIR, SERVER_CLASS + ".java")
+        compiled = os.path.join(SERVER_DIR, SERVER_CLASS + ".class")
+        if not os.path.exists(compiled) or os.path.getmtime(compiled) < os.path.getmtime(source):
+            subprocess.check_call(["javac", "-cp", classpath, "-d", SERVER_DIR, source], cwd = self._workingDir)
+
+    def _start(self):
+        self._process = subprocess.Popen(self._command(), cwd = self._workingDir, stdin = subprocess.PIPE, stdout = subprocess.PIPE)
+
+    def _request(self, data, type):
+        self._process.stdin.write("%s %d\n" % (type, len(data)))
+        self._process.stdin.write(data)
+        self._process.stdin.flush()
+        header = self._process.stdout.readline().split()
+        if len(header) != 2:
+            raise IOError("LingPipe server closed its output")
+        status, length = header[0], int(header[1])
+        output = self._process.stdout.read(length)
+        if len(output) < length:
+            raise IOError("Truncated LingPipe server response")
+        if status != "OK":
+            raise LingPipeError(output)
+        return output
+
+    def process(self, data, type):
+        """sends a document to the server, restarting the JVM once if it has crashed"""
+        self._lock.acquire()
+        try:
+            for attempt in range(2):
+                if self._process == None or self._process.poll() != None:
+                    self._start()
+                try:
+                    return self._request(data, type)
+                except IOError:
+                    self.close()
+                    if attempt == 1:
+                        raise
+        finally:
+            self._lock.release()
+
+    def close(self):
+        if not self._process == None:
+            try:
+                self._process.stdin.close()
+                self._process.wait()
+            except (IOError, OSError):
+                pass
+            self._process = None
+
 
 class LingPipeWarper:
 
-    def __init__(self, lingPipePath):
+    def __init__(self, lingPipePath, server = False):
         self._lingPipePath = os.path.abspath(lingPipePath)
+        self._workingDir = os.path.join(self._lingPipePath, "demos/generic/bin")
+        self._server = None
+        if server:
+            self._server = LingPipeServer(self._workingDir, os.path.join(self._workingDir, "cmd_ne_en_news_muc6.%s" % SHELL_EXT[os.name]))
 
+    @timed("lingpipe.document")
     def parseNamedEntities(self, input, type):
-        shellExt = {"nt": "bat", "posix": "sh"}        
-        workingDir = os.path.join(self._lingPipePath, "demos/generic/bin")
-        program = "cmd_ne_en_news_muc6.%s \"-contentType=%s\" \"-outCharset=utf-8\" \"-inCharset=utf-8\"" % (shellExt[os.name], type)
-        lingpipe = subprocess.Popen(program, cwd = workingDir, shell = True, stdin = subprocess.PIPE, stdout = subprocess.PIPE)
-        lingpipe.stdin.write(input.encode("UTF-8"))
+        if self._server == None:
+            output = self._parseOnce(input.encode("UTF-8"), type)
+        else:
+            output = self._server.process(input.encode("UTF-8"), type)
+        return re.split("<\?xml.*?\?>", output, 1)[1]
+
+    @timed("lingpipe.batch")
+    def parseNamedEntitiesBatch(self, inputs, type):
+        """parses several documents with a single LingPipe request and a single HTML parse. Returns one parsed document per input."""
+        if len(inputs) == 0:
+            return []
+        if type == "text/plain":
+            inputs = map(cgi.escape, inputs)
+        output = self.parseNamedEntities(BATCH_SEPARATOR.join(inputs), "text/html")
+        documents = splitAtSeparators(etree.fromstring(output, etree.HTMLParser()))
+        if len(documents) != len(inputs):
+            # LingPipe did not keep every separator, fall back to one request per document
+            documents = [etree.fromstring(self.parseNamedEntities(input, type), etree.HTMLParser()) for input in inputs]
+        return documents
+
+    def _parseOnce(self, data, type):
+        """runs a new LingPipe process for a single document"""
+        program = "cmd_ne_en_news_muc6.%s \"-contentType=%s\" \"-outCharset=utf-8\" \"-inCharset=utf-8\"" % (SHELL_EXT[os.name], type)
+        lingpipe = subprocess.Popen(program, cwd = self._workingDir, shell = True, stdin = subprocess.PIPE, stdout = subprocess.PIPE)
+        lingpipe.stdin.write(data)
         lingpipe.stdin.close()
-        output = re.split("<\?xml.*?\?>", lingpipe.stdout.read(), 1)[1]
+        output = lingpipe.stdout.read()
         lingpipe.stdout.close()
-        return output;
-    
+        return output
+
+    def close(self):
+        """stops the LingPipe server, if any"""
+        if not self._server == None:
+            self._server.close()
+
+
 if __name__ == "__main__":
-    lingPipe = LingPipeWarper("lingpipe-3.8.2")
+    lingPipe = LingPipeWarper("lingpipe-3.8.2", server = True)
     print lingPipe.parseNamedEntities("John Smith lives in <b>Washington</b>. He works for Microsoft.", "text/html")
-
+    print lingPipe.parseNamedEntities("Barack Obama met Angela Merkel in Berlin.", "text/plain")
+    for document in lingPipe.parseNamedEntitiesBatch(["Barack Obama met Angela Merkel in Berlin.", "IBM opened an office in <i>Copenhagen</i>."], "text/html"):
+        print etree.tostring(document)
+    lingPipe.close()
@@ -0,0 +1,167 @@
+'''
+Web 2.0 & Mobile Interaction -- Final Project
+December 4, 2009
+
+Olivier Jais-Nielsen (s090763)
+Andrea Lai (s091088)
+
+The Enhanced Feed Reader uses latent semantic analysis to identify people, organizations, and places within an RSS feed and pull in relevant additional content (Google Maps, Google Search, and recent tweets) for display.
+
+
+metrics.py records the time spent in each stage of the feed reader, call counts and cache hit ratios
+'''
+
+import time
+import threading
+import functools
+import simplejson
+
+# upper bounds of the histogram buckets, in seconds, from half a millisecond to about a minute
+BUCKETS = [0.0005 * 2 ** i for i in range(18)]
+
+
+class Histogram:
+    """Latencies counted in exponential buckets, with their count, sum, minimum and maximum"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.
+        self.min = None
+        self.max = None
+
+    def add(self, seconds):
+        i = 0
+        while i < len(BUCKETS) and seconds > BUCKETS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.total += seconds
+        if self.min == None or seconds < self.min:
+            self.min = seconds
+        if self.max == None or seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p):
+        """returns the upper bound of the bucket holding the p-th percentile (the maximum for the last bucket)"""
+        if self.count == 0:
+            return 0.
+        seen = 0
+        for (i, count) in enumerate(self.counts):
+            seen += count
+            if seen >= p / 100. * self.count:
+                if i < len(BUCKETS):
+                    return min(BUCKETS[i], self.max)
+                return self.max
+        return self.max
+
+    def asDict(self):
+        mean = 0.
+        if self.count > 0:
+            mean = self.total / self.count
+        return {"count": self.count, "total": self.total, "mean": mean, "min": self.min or 0., "max": self.max or 0.,
+                "p50": self.percentile(50), "p90": self.percentile(90), "p99": self.percentile(99),
+                "buckets": dict([(str(bound), count) for (bound, count) in zip(BUCKETS + ["inf"], self.counts) if count > 0])}
+
+
+class Metrics:
+    """
+    A registry of latency histograms (timers), counters and hit ratios, by name.
+    Sources are functions returning the stats kept elsewhere (connection pool, caches...), included as they are in the snapshots.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sources = {}
+        self.reset()
+
+    def reset(self):
+        self._lock.acquire()
+        self._timers = {}
+        self._counters = {}
+        self._ratios = {}
+        self._lock.release()
+
+    def observe(self, name, seconds):
+        self._lock.acquire()
+        self._timers.setdefault(name, Histogram()).add(seconds)
+        self._lock.release()
+
+    def count(self, name, n = 1):
+        self._lock.acquire()
+        self._counters[name] = self._counters.get(name, 0) + n
+        self._lock.release()
+
+    def hit(self, name, hit):
+        """counts a lookup of the cache name, as a hit or a miss"""
+        self._lock.acquire()
+        ratio = self._ratios.setdefault(name, [0, 0])
+        ratio[not hit] += 1
+        self._lock.release()
+
+    def addSource(self, name, function):
+        self._sources[name] = function
+
+    def snapshot(self):
+        """returns every measure as a dictionary"""
+        self._lock.acquire()
+        try:
+            timers = dict([(name, histogram.asDict()) for (name, histogram) in self._timers.items()])
+            counters = dict(self._counters)
+            ratios = dict([(name, {"hits": hits, "misses": misses, "ratio": float(hits) / max(1, hits + misses)}) for (name, (hits, misses)) in self._ratios.items()])
+        finally:
+            self._lock.release()
+        sources = dict([(name, function()) for (name, function) in self._sources.items()])
+        return {"timers": timers, "counters": counters, "ratios": ratios, "sources": sources, "time": time.time()}
+
+    def toJson(self):
+        return simplejson.dumps(self.snapshot(), indent = 2, sort_keys = True)
+
+    def report(self):
+        """returns the measures as a text table"""
+        snapshot = self.snapshot()
+        lines = ["%-32s %8s %10s %9s %9s %9s %9s" % ("timer", "count", "total (s)", "mean (ms)", "p50 (ms)", "p90 (ms)", "max (ms)")]
+        for (name, timer) in sorted(snapshot["timers"].items()):
+            lines.append("%-32s %8d %10.3f %9.1f %9.1f %9.1f %9.1f" % (name, timer["count"], timer["total"], 1000 * timer["mean"], 1000 * timer["p50"], 1000 * timer["p90"], 1000 * timer["max"]))
+        if len(snapshot["counters"]) > 0:
+            lines.append("")
+            lines.append("%-32s %8s" % ("counter", "value"))
+            for (name, value) in sorted(snapshot["counters"].items()):
+                lines.append("%-32s %8d" % (name, value))
+        if len(snapshot["ratios"]) > 0:
+            lines.append("")
+            lines.append("%-32s %8s %8s %8s" % ("cache", "hits", "misses", "ratio"))
+            for (name, ratio) in sorted(snapshot["ratios"].items()):
+                lines.append("%-32s %8d %8d %7.1f%%" % (name, ratio["hits"], ratio["misses"], 100 * ratio["ratio"]))
+        for (name, source) in sorted(snapshot["sources"].items()):
+            lines.append("")
+            lines.append("%s: %s" % (name, simplejson.dumps(source, sort_keys = True)))
+        return "\n".join(lines)
+
+    def save(self, filename):
+        """writes the measures to a file, as JSON if its name ends with .json, else as a text report"""
+        output = open(filename, "w")
+        if filename.endswith(".json"):
+            output.write(self.toJson())
+        else:
+            output.write(self.report())
+        output.write("\n")
+        output.close()
+
+
+# the registry used throughout the feed reader
+metrics = Metrics()
+
+
+def timed(name):
+    """decorator recording the duration of every call of a function in the timer name"""
+    def decorate(function):
+        @functools.wraps(function)
+        def timedFunction(*args, **kwargs):
+            started = time.time()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                metrics.observe(name, time.time() - started)
+        return timedFunction
+    return decorate
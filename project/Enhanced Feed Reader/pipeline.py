@@ -0,0 +1,197 @@
+'''
+Web 2.0 & Mobile Interaction -- Final Project
+December 4, 2009
+
+Olivier Jais-Nielsen (s090763)
+Andrea Lai (s091088)
+
+The Enhanced Feed Reader uses latent semantic analysis to identify people, organizations, and places within an RSS feed and pull in relevant additional content (Google Maps, Google Search, and recent tweets) for display.
+
+
+pipeline.py runs feed ingestion (fetch, named entity recognition, entry building) as concurrent stages
+'''
+
+import time
+import threading
+import Queue
+import feedparser
+from workers import WorkerPool
+from metrics import metrics
+
+
+class FeedStats:
+    """Counts and timings of the ingestion of one feed"""
+
+    def __init__(self, url):
+        self.url = url
+        self.started = time.time()
+        self.fetchTime = 0.
+        self.totalTime = 0.
+        self.entries = 0
+        self.newEntries = 0
+        self.built = 0
+        self.failed = 0
+        self.error = None
+        self.unchanged = False
+
+    def finished(self):
+        return self.built + self.failed == self.newEntries
+
+    def __str__(self):
+        if not self.error == None:
+            return "%s: failed (%s) after %.2fs" % (self.url, self.error, self.totalTime)
+        if self.unchanged:
+            return "%s: unchanged, checked in %.2fs" % (self.url, self.totalTime)
+        return "%s: %d entries, %d new, %d built, %d failed, fetched in %.2fs, done in %.2fs" % (self.url, self.entries, self.newEntries, self.built, self.failed, self.fetchTime, self.totalTime)
+
+
+class IngestionPipeline:
+    """
+    Feeds go through three stages connected by bounded queues, each with its own worker pool:
+    fetching and parsing the feed, LingPipe annotation (one worker per LingPipe warper, in batches) and entry building
+    (Wikipedia resolution and geocoding, which is I/O bound and gets the most workers).
+    onEntry(entry) is called from the building workers as soon as an entry is ready, onProgress(done, total) after each entry
+    and onFeedDone(feedStats) once every new entry of a feed has been processed.
+    With a feed cache, unchanged feeds are not parsed at all. Entries for which isKnown(link, guid) is true never reach LingPipe.
+    """
+
+    def __init__(self, builder, lingPipeWarpers, onEntry, onProgress = None, onFeedDone = None, fetchWorkers = 2, buildWorkers = 4, batchSize = 10, queueSize = 32, feedCache = None, isKnown = None):
+        self._builder = builder
+        self._feedCache = feedCache
+        self._isKnown = isKnown
+        self._onEntry = onEntry
+        self._onProgress = onProgress
+        self._onFeedDone = onFeedDone
+        self._batchSize = batchSize
+        self._lingPipeWarpers = Queue.Queue()
+        for lingPipeWarper in lingPipeWarpers:
+            self._lingPipeWarpers.put(lingPipeWarper)
+        self._fetchPool = WorkerPool(fetchWorkers, queueSize, "fetch", True)
+        self._nerPool = WorkerPool(len(lingPipeWarpers), queueSize, "ner", True)
+        self._buildPool = WorkerPool(buildWorkers, queueSize, "build", True)
+        self._lock = threading.Lock()
+        self._seenLinks = set()
+        self._total = 0
+        self._done = 0
+
+    def submitFeed(self, url):
+        """queues a feed for ingestion and returns immediately"""
+        self._fetchPool.submit(self._fetch, FeedStats(url))
+
+    def join(self):
+        """waits until every submitted feed has gone through all the stages"""
+        self._fetchPool.join()
+        self._nerPool.join()
+        self._buildPool.join()
+
+    def _newEntries(self, feedEntries):
+        self._lock.acquire()
+        try:
+            newEntries = []
+            for feedEntry in feedEntries:
+                if not "link" in feedEntry:
+                    # cannot be told apart from the others, nor linked to
+                    continue
+                if not feedEntry.link in self._seenLinks and not (self._isKnown != None and self._isKnown(feedEntry.link, feedEntry.get("id", ""))):
+                    self._seenLinks.add(feedEntry.link)
+                    newEntries.append(feedEntry)
+            self._total += len(newEntries)
+            return newEntries
+        finally:
+            self._lock.release()
+
+    def forget(self):
+        """forgets the links of the entries already ingested and the state of the feeds, e.g. after another database has been loaded"""
+        self._lock.acquire()
+        self._seenLinks.clear()
+        self._lock.release()
+        if not self._feedCache == None:
+            self._feedCache.clear()
+
+    def _entryDone(self, feedStats, feedEntry, failed = False):
+        self._lock.acquire()
+        if failed:
+            # allows the entry to be retried with the next load of its feed
+            self._seenLinks.discard(feedEntry.link)
+            feedStats.failed += 1
+        else:
+            feedStats.built += 1
+        self._done += 1
+        done, total = self._done, self._total
+        feedDone = feedStats.finished()
+        self._lock.release()
+        if not self._onProgress == None:
+            self._onProgress(done, total)
+        if feedDone:
+            self._feedDone(feedStats)
+
+    def _feedDone(self, feedStats):
+        feedStats.totalTime = time.time() - feedStats.started
+        metrics.observe("pipeline.feed", feedStats.totalTime)
+        metrics.count("pipeline.feeds")
+        metrics.count("pipeline.entriesBuilt", feedStats.built)
+        metrics.count("pipeline.entriesFailed", feedStats.failed)
+        if feedStats.unchanged:
+            metrics.count("pipeline.feedsUnchanged")
+        if not feedStats.error == None:
+            metrics.count("pipeline.feedsFailed")
+        if not self._feedCache == None:
+            if feedStats.failed > 0 or not feedStats.error == None:
+                self._feedCache.invalidate(feedStats.url)
+            else:
+                self._feedCache.commit(feedStats.url)
+        if not self._onFeedDone == None:
+            self._onFeedDone(feedStats)
+
+    def _fetch(self, feedStats):
+        try:
+            if self._feedCache == None:
+                feed = feedparser.parse(feedStats.url)
+            else:
+                feed = self._feedCache.fetch(feedStats.url)
+        except Exception, e:
+            feedStats.error = e
+            self._feedDone(feedStats)
+            raise
+        try:
+            feedStats.fetchTime = time.time() - feedStats.started
+            metrics.observe("pipeline.fetch", feedStats.fetchTime)
+            if not feed == None:
+                feedStats.entries = len(feed.entries)
+                feedEntries = self._newEntries(feed.entries)
+                feedStats.newEntries = len(feedEntries)
+        except Exception, e:
+            # _feedDone is always called, or the feed would never be done for the scheduler
+            feedStats.error = e
+            self._feedDone(feedStats)
+            raise
+        if feed == None:
+            feedStats.unchanged = True
+            self._feedDone(feedStats)
+            return
+        if len(feedEntries) == 0:
+            self._feedDone(feedStats)
+        for i in range(0, len(feedEntries), self._batchSize):
+            self._nerPool.submit(self._annotate, feedStats, feedEntries[i:i + self._batchSize])
+
+    def _annotate(self, feedStats, feedEntries):
+        lingPipeWarper = self._lingPipeWarpers.get()
+        try:
+            documents = lingPipeWarper.parseNamedEntitiesBatch(map(lambda feedEntry: unicode(feedEntry.summary), feedEntries), "text/html")
+        except:
+            for feedEntry in feedEntries:
+                self._entryDone(feedStats, feedEntry, True)
+            raise
+        finally:
+            self._lingPipeWarpers.put(lingPipeWarper)
+        for (feedEntry, document) in zip(feedEntries, documents):
+            self._buildPool.submit(self._build, feedStats, feedEntry, document)
+
+    def _build(self, feedStats, feedEntry, document):
+        try:
+            entry = self._builder.build(document, feedEntry.title, feedEntry.link, feedEntry.date, feedEntry.get("id", ""))
+            self._onEntry(entry)
+        except:
+            self._entryDone(feedStats, feedEntry, True)
+            raise
+        self._entryDone(feedStats, feedEntry)
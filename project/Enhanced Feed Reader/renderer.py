@@ -0,0 +1,56 @@
+'''
+Web 2.0 & Mobile Interaction -- Final Project
+December 4, 2009
+
+Olivier Jais-Nielsen (s090763)
+Andrea Lai (s091088)
+
+The Enhanced Feed Reader uses latent semantic analysis to identify people, organizations, and places within an RSS feed and pull in relevant additional content (Google Maps, Google Search, and recent tweets) for display.
+
+
+renderer.py renders pages of feed entries to HTML with template.xsl and caches the rendered pages
+'''
+
+from collections import OrderedDict
+from lxml import etree
+from metrics import metrics, timed
+
+
+class PageRenderer:
+    """
+    Renders one page of entries at a time: only the entries of the page (with their bodies) are put in the document given to template.xsl.
+    Rendered pages are kept in a LRU cache keyed by the page position, the links of its entries and the entity types,
+    so a page is only rendered again when its entries change.
+    With async, tweets and searches are left as placeholders (see enrichment.py) instead of being fetched during the transform.
+    """
+
+    def __init__(self, templatePath = "template.xsl", cacheSize = 32):
+        self.applyTemplate = etree.XSLT(etree.parse(templatePath))
+        self._cacheSize = cacheSize
+        self._cache = OrderedDict()
+
+    def clear(self):
+        self._cache.clear()
+
+    def pageDocument(self, entries, types, withBodies):
+        """builds the document given to the template: the entity types followed by copies of the entries with their bodies"""
+        page = etree.Element("efrDb")
+        for type in types:
+            etree.SubElement(page, "type").text = type
+        page.extend(map(withBodies, entries))
+        return page
+
+    @timed("renderer.render")
+    def render(self, entries, start, types, withBodies, async = True):
+        """returns the HTML of the page made of the given entries, the first of which has index start. withBodies(entry) returns a copy of an entry with its body."""
+        key = (start, tuple(map(lambda entry: entry.get("link"), entries)), tuple(types), async)
+        metrics.hit("renderer.pages", key in self._cache)
+        if key in self._cache:
+            html = self._cache.pop(key)
+        else:
+            output = self.applyTemplate(self.pageDocument(entries, types, withBodies), offset = str(start), async = {True: "'yes'", False: "'no'"}[async])
+            html = etree.tostring(output, encoding = "UTF-8")
+        self._cache[key] = html
+        while len(self._cache) > self._cacheSize:
+            self._cache.popitem(False)
+        return html
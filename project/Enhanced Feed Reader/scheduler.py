@@ -0,0 +1,168 @@
+'''
+Web 2.0 & Mobile Interaction -- Final Project
+December 4, 2009
+
+Olivier Jais-Nielsen (s090763)
+Andrea Lai (s091088)
+
+The Enhanced Feed Reader uses latent semantic analysis to identify people, organizations, and places within an RSS feed and pull in relevant additional content (Google Maps, Google Search, and recent tweets) for display.
+
+
+scheduler.py keeps a list of subscribed feeds and submits each to the ingestion pipeline on its own polling interval
+'''
+
+import os
+import time
+import threading
+import simplejson
+
+
+class Subscription:
+    """A subscribed feed, its current polling interval and the history used to adapt it"""
+
+    def __init__(self, url, interval, nextPoll = 0, polls = 0, errors = 0, lastNew = None):
+        self.url = url
+        self.interval = interval
+        self.nextPoll = nextPoll
+        self.polls = polls
+        self.errors = errors
+        self.lastNew = lastNew
+
+    def asDict(self):
+        return {"url": self.url, "interval": self.interval, "nextPoll": self.nextPoll, "polls": self.polls, "errors": self.errors, "lastNew": self.lastNew}
+
+
+class FeedScheduler:
+    """
+    Polls the subscribed feeds through an IngestionPipeline, never more than maxConcurrent at a time, the most overdue first.
+    The interval of a feed aims at targetNew new entries per poll: it shrinks when a poll brings more and grows (up to maxInterval) when the feed is quiet.
+    A feed that cannot be fetched is retried with an exponential backoff. The first poll of a feed, which returns its whole backlog, is not used.
+    The pipeline's onFeedDone must call feedDone (the owner of both forwards it), and subscriptions are saved to path whenever they change.
+    """
+
+    def __init__(self, pipeline, path = None, minInterval = 300, maxInterval = 6 * 3600, initialInterval = 1800, maxConcurrent = 4, targetNew = 2):
+        self._pipeline = pipeline
+        self._path = path
+        self._minInterval = minInterval
+        self._maxInterval = maxInterval
+        self._initialInterval = initialInterval
+        self._maxConcurrent = maxConcurrent
+        self._targetNew = targetNew
+        self._subscriptions = {}
+        self._polling = set()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        if not path == None and os.path.exists(path):
+            subscriptionsFile = open(path)
+            for subscription in simplejson.load(subscriptionsFile):
+                self._subscriptions[subscription["url"]] = Subscription(**dict([(str(key), value) for (key, value) in subscription.items()]))
+            subscriptionsFile.close()
+
+    def _save(self):
+        """writes the subscriptions. Called with the lock held."""
+        if not self._path == None:
+            subscriptionsFile = open(self._path + ".tmp", "w")
+            simplejson.dump([subscription.asDict() for subscription in self._subscriptions.values()], subscriptionsFile, indent = 1)
+            subscriptionsFile.close()
+            if os.name == "nt" and os.path.exists(self._path):
+                os.remove(self._path)
+            os.rename(self._path + ".tmp", self._path)
+
+    def subscriptions(self):
+        """returns the subscribed URLs"""
+        self._condition.acquire()
+        try:
+            return sorted(self._subscriptions.keys())
+        finally:
+            self._condition.release()
+
+    def subscribe(self, url):
+        """adds a feed, polled as soon as possible"""
+        self._condition.acquire()
+        if not url in self._subscriptions:
+            self._subscriptions[url] = Subscription(url, self._initialInterval)
+            self._save()
+            self._condition.notify()
+        self._condition.release()
+
+    def unsubscribe(self, url):
+        self._condition.acquire()
+        if url in self._subscriptions:
+            del self._subscriptions[url]
+            self._save()
+        self._condition.release()
+
+    def _clamp(self, interval):
+        return max(self._minInterval, min(self._maxInterval, interval))
+
+    def feedDone(self, feedStats):
+        """adapts the interval of a feed once its poll has been ingested"""
+        self._condition.acquire()
+        try:
+            self._polling.discard(feedStats.url)
+            subscription = self._subscriptions.get(feedStats.url)
+            if subscription == None:
+                return
+            subscription.polls += 1
+            if not feedStats.error == None:
+                subscription.errors += 1
+                subscription.interval = self._clamp(subscription.interval * 2)
+            elif feedStats.unchanged or feedStats.newEntries == 0:
+                subscription.errors = 0
+                subscription.interval = self._clamp(subscription.interval * 1.5)
+            else:
+                subscription.errors = 0
+                subscription.lastNew = time.time()
+                if subscription.polls > 1:
+                    # halfway between the current interval and the one which would have brought targetNew entries
+                    subscription.interval = self._clamp((subscription.interval + subscription.interval * self._targetNew / feedStats.newEntries) / 2.)
+            subscription.nextPoll = time.time() + subscription.interval
+            self._save()
+            self._condition.notify()
+        finally:
+            self._condition.release()
+
+    def _run(self):
+        while True:
+            self._condition.acquire()
+            try:
+                if self._stopped:
+                    return
+                now = time.time()
+                due = sorted([(subscription.nextPoll, url) for (url, subscription) in self._subscriptions.items() if not url in self._polling])
+                submitted = []
+                for (nextPoll, url) in due:
+                    if nextPoll > now or len(self._polling) >= self._maxConcurrent:
+                        break
+                    self._polling.add(url)
+                    submitted.append(url)
+                if len(submitted) == 0:
+                    waits = [nextPoll - now for (nextPoll, url) in due if nextPoll > now]
+                    if len(self._polling) >= self._maxConcurrent or len(waits) == 0:
+                        # woken up by feedDone or subscribe
+                        self._condition.wait(60)
+                    else:
+                        self._condition.wait(min(waits))
+            finally:
+                self._condition.release()
+            # submitFeed blocks while the fetch queue is full, and the workers need the lock to call feedDone
+            for url in submitted:
+                self._pipeline.submitFeed(url)
+
+    def start(self):
+        """starts polling in a background thread"""
+        self._stopped = False
+        self._thread = threading.Thread(target = self._run, name = "scheduler")
+        self._thread.setDaemon(True)
+        self._thread.start()
+
+    def stop(self):
+        """stops submitting feeds. The feeds already submitted are still ingested."""
+        self._condition.acquire()
+        self._stopped = True
+        self._condition.notify()
+        self._condition.release()
+        if not self._thread == None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,138 @@
+'''
+Web 2.0 & Mobile Interaction -- Final Project
+December 4, 2009
+
+Olivier Jais-Nielsen (s090763)
+Andrea Lai (s091088)
+
+The Enhanced Feed Reader uses latent semantic analysis to identify people, organizations, and places within an RSS feed and pull in relevant additional content (Google Maps, Google Search, and recent tweets) for display.
+
+
+sortedindex.py provides a read-only key-value index stored in a sorted text file and searched through a memory map
+'''
+
+import os
+import mmap
+import heapq
+import tempfile
+
+
+def _encode(text):
+    if isinstance(text, unicode):
+        return text.encode("utf-8")
+    return text
+
+def _cleanKey(key):
+    return _encode(key).replace("\t", " ").replace("\n", " ").replace("\r", " ")
+
+def _writeRun(lines):
+    lines.sort()
+    run = tempfile.TemporaryFile()
+    run.writelines(lines)
+    run.seek(0)
+    return run
+
+def buildIndex(path, pairs, runSize = 500000):
+    """
+    Writes the (key, value) pairs to an index file, one "key<tab>value" line each, sorted by key (as UTF-8 bytes).
+    The pairs are sorted in runs of runSize lines which are then merged, so large dumps can be indexed with bounded memory.
+    Duplicate lines are dropped. Keys must not contain control characters other than tabs and newlines, which are replaced by spaces.
+    """
+    runs = []
+    lines = []
+    for (key, value) in pairs:
+        lines.append("%s\t%s\n" % (_cleanKey(key), _encode(value).replace("\n", " ")))
+        if len(lines) >= runSize:
+            runs.append(_writeRun(lines))
+            lines = []
+    lines.sort()
+    output = open(path + ".tmp", "wb")
+    previous = None
+    for line in heapq.merge(lines, *runs):
+        if not line == previous:
+            output.write(line)
+        previous = line
+    output.close()
+    for run in runs:
+        run.close()
+    if os.name == "nt" and os.path.exists(path):
+        os.remove(path)
+    os.rename(path + ".tmp", path)
+
+
+class SortedIndex:
+    """An index file written by buildIndex. Lookups are binary searches on the mapped file, so opening it costs nothing and it can be shared by threads."""
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._size = os.path.getsize(path)
+        if self._size == 0:
+            self._map = ""
+        else:
+            self._map = mmap.mmap(self._file.fileno(), 0, access = mmap.ACCESS_READ)
+
+    def _line(self, start):
+        """returns the key and value of the line starting at some offset, and the offset of the next line"""
+        end = self._map.find("\n", start)
+        if end == -1:
+            end = self._size
+        (key, value) = (self._map[start:end].split("\t", 1) + [""])[:2]
+        return (key, value, end + 1)
+
+    def _lowerBound(self, key, low = 0):
+        """returns the offset of the first line whose key is not lower than key, searching from offset low (the start of a line)"""
+        high = self._size
+        while low < high:
+            middle = (low + high) // 2
+            start = self._map.rfind("\n", low, middle) + 1
+            if start == 0:
+                start = low
+            (lineKey, value, next) = self._line(start)
+            if lineKey < key:
+                low = next
+            else:
+                high = start
+        return low
+
+    def scan(self, key, count):
+        """returns at most count (key, value) pairs, in order, starting from the first key not lower than key"""
+        offset = self._lowerBound(_cleanKey(key))
+        pairs = []
+        while offset < self._size and len(pairs) < count:
+            (lineKey, value, offset) = self._line(offset)
+            pairs.append((lineKey.decode("utf-8"), value.decode("utf-8")))
+        return pairs
+
+    def _values(self, key, offset):
+        """returns the values of key, its lines starting at offset, and the offset of the first line after them"""
+        values = []
+        while offset < self._size:
+            (lineKey, value, next) = self._line(offset)
+            if not lineKey == key:
+                break
+            values.append(value.decode("utf-8"))
+            offset = next
+        return (values, offset)
+
+    def get(self, key):
+        """returns the list of the values of a key"""
+        key = _cleanKey(key)
+        return self._values(key, self._lowerBound(key))[0]
+
+    def getMany(self, keys):
+        """returns a dictionary of the lists of values of some keys, looked up in order so that each search starts where the previous one ended"""
+        values = {}
+        offset = 0
+        for cleanKey in sorted(set(map(_cleanKey, keys))):
+            (values[cleanKey], offset) = self._values(cleanKey, self._lowerBound(cleanKey, offset))
+        return dict([(key, values[_cleanKey(key)]) for key in keys])
+
+    def prefix(self, prefix, count):
+        """returns at most count (key, value) pairs whose key starts with prefix"""
+        prefix = _cleanKey(prefix).decode("utf-8")
+        return [(key, value) for (key, value) in self.scan(prefix, count) if key.startswith(prefix)]
+
+    def close(self):
+        if not self._map == "":
+            self._map.close()
+        self._file.close()
@@ -11,8 +11,10 @@
         doctype-system="http://www.w3.org/TR/xhtml1/DTD/xhtml1-strict.dtd"/>
 
 
-    <xsl:param name="start"/>
-    <xsl:param name="end"/>
+    <!-- the document holds the entry types and the entries of one page, the first of which has index $offset -->
+    <xsl:param name="offset" select="0"/>
+    <!-- with async = 'yes', tweets and searches are replaced by placeholders filled in later by fillEnrichment() -->
+    <xsl:param name="async" select="'no'"/>
 
     <xsl:template match="/">
 
@@ -36,7 +38,7 @@
                 <form id="entities" onsubmit="return false">
                     <ul>
 
-                        <xsl:for-each select="set:distinct(/efrDb/entry/head/entity/@type)">
+                        <xsl:for-each select="/efrDb/type">
                             <li>
                                 <xsl:value-of select="."/>
                         
@@ -55,12 +57,12 @@
                 </form>
                 <ul id="entries">
 
-                    <xsl:for-each select="/efrDb/entry[count(preceding-sibling::entry) &gt;= $start and count(preceding-sibling::entry) &lt; $end]">
+                    <xsl:for-each select="/efrDb/entry">
                         <li class="ENTRY">
                             <xsl:attribute name="id">
-                                <xsl:value-of select="count(preceding-sibling::entry)"/>
+                                <xsl:value-of select="$offset + count(preceding-sibling::entry)"/>
                             </xsl:attribute>
-                            <xsl:if test="number(count(preceding-sibling::entry)) mod 2 = 0">
+                            <xsl:if test="($offset + count(preceding-sibling::entry)) mod 2 = 0">
                                 <xsl:attribute name="class">
                                     <xsl:text>ENTRY EVEN</xsl:text>
                                 </xsl:attribute>
@@ -101,9 +103,23 @@
 
                                                 </xsl:when>
                                            
+                                                <xsl:when test="@type = 'PERSON' and $async = 'yes'">
+                                                    <div class="PENDING">
+                                                        <xsl:attribute name="title">
+                                                            <xsl:value-of select="concat('getTweets/', .)"/>
+                                                        </xsl:attribute>
+                                                    </div>
+                                                </xsl:when>
                                                 <xsl:when test="@type = 'PERSON'">
                                                     <xsl:copy-of select="efr:getTweets(string(.))"/>
                                                 </xsl:when>
+                                                <xsl:when test="$async = 'yes'">
+                                                    <div class="PENDING">
+                                                        <xsl:attribute name="title">
+                                                            <xsl:value-of select="concat('getGoogleSearch/', .)"/>
+                                                        </xsl:attribute>
+                                                    </div>
+                                                </xsl:when>
                                                 <xsl:otherwise>
                                                     <xsl:copy-of select="efr:getGoogleSearch(string(.))"/>
                                                 </xsl:otherwise>
@@ -1,12 +1,40 @@
-from PyQt4.QtCore import *
 from os import path
+import urlparse
+import urllib
 
 
 
 def getFullUrl(context, input):
     """facilitates calling file path names"""
+    # imported here so that the modules shared with the headless batch reader do not need PyQt4
+    from PyQt4.QtCore import QUrl
     return str(QUrl.fromLocalFile(path.abspath(input)).toString())
 
 def escapeQuotesXml(input):
     """Prepares a string to be inserted into a XML document"""
-    return input.replace("\"", "&quot;").replace("'", "&apos;")
\ No newline at end of file
+    return input.replace("\"", "&quot;").replace("'", "&apos;")
+
+def normalizeUrl(url):
+    """Gives a canonical form of a URL, for duplicate detection: lower case scheme and host, no default port or tracking parameters.
+    The fragment is kept: some sites (e.g. "#!" links) tell their items apart by it alone."""
+    (scheme, netloc, urlPath, query, fragment) = urlparse.urlsplit(url.strip())
+    scheme = scheme.lower()
+    netloc = netloc.lower()
+    if (scheme, netloc.rsplit(":", 1)[-1]) in (("http", "80"), ("https", "443")):
+        netloc = netloc.rsplit(":", 1)[0]
+    if isinstance(query, unicode):
+        # parsed and quoted again as UTF-8 bytes, so that non ASCII parameters (given as is or percent-encoded) come out percent-encoded
+        query = query.encode("utf-8")
+    query = urllib.urlencode(sorted(filter(lambda (key, value): not key.startswith("utm_"), urlparse.parse_qsl(query, True))))
+    return urlparse.urlunsplit((scheme, netloc, urlPath or "/", query, fragment))
+
+
+if __name__ == "__main__":
+    assert normalizeUrl("HTTP://Example.com:80/a?utm_source=x&b=2&a=1#top") == "http://example.com/a?a=1&b=2#top"
+    assert normalizeUrl("http://twitter.com/#!/cnn/status/123") == "http://twitter.com/#!/cnn/status/123"
+    assert not normalizeUrl("http://twitter.com/#!/cnn/status/123") == normalizeUrl("http://twitter.com/#!/bbc/status/9")
+    assert normalizeUrl("http://example.com/a#") == "http://example.com/a"
+    assert normalizeUrl(u"http://example.com/a?q=caf%C3%A9") == u"http://example.com/a?q=caf%C3%A9"
+    assert normalizeUrl(u"http://example.com/a?q=caf\xe9&utm_medium=rss") == u"http://example.com/a?q=caf%C3%A9"
+    assert normalizeUrl("http://example.com/a?q=caf%C3%A9") == "http://example.com/a?q=caf%C3%A9"
+    print "normalizeUrl ok"
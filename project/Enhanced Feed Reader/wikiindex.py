@@ -0,0 +1,122 @@
+'''
+Web 2.0 & Mobile Interaction -- Final Project
+December 4, 2009
+
+Olivier Jais-Nielsen (s090763)
+Andrea Lai (s091088)
+
+The Enhanced Feed Reader uses latent semantic analysis to identify people, organizations, and places within an RSS feed and pull in relevant additional content (Google Maps, Google Search, and recent tweets) for display.
+
+
+wikiindex.py resolves entity names to Wikipedia article titles offline, with an index built from the Wikipedia dumps.
+Usage: python wikiindex.py enwiki-latest-all-titles-in-ns0.gz redirects.tsv enwiki-titles.idx
+'''
+
+import re
+import sys
+import gzip
+import difflib
+from optparse import OptionParser
+from sortedindex import buildIndex, SortedIndex
+
+# key of the line recording that the redirects were indexed (no title folds to an empty key)
+REDIRECTS_MARKER = ""
+
+
+def foldTitle(title):
+    """returns the form of a title used as key: lower case, with spaces for underscores and runs of white space"""
+    if not isinstance(title, unicode):
+        title = title.decode("utf-8")
+    return re.sub(r"\s+", " ", title.replace("_", " ")).strip().lower()
+
+def _displayTitle(title):
+    return re.sub(r"\s+", " ", title.decode("utf-8").replace("_", " ")).strip()
+
+def _openDump(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+def _dumpPairs(titlesPath, redirectsPath):
+    for line in _openDump(titlesPath):
+        title = _displayTitle(line)
+        if not title == "" and not title == "page title":
+            yield (foldTitle(title), u"%s\t%s" % (title, title))
+    for line in _openDump(redirectsPath):
+        fields = line.rstrip("\r\n").split("\t")
+        if len(fields) >= 2:
+            yield (foldTitle(fields[0]), u"%s\t%s" % (_displayTitle(fields[0]), _displayTitle(fields[1])))
+    yield (REDIRECTS_MARKER, u"redirects")
+
+def buildWikipediaIndex(path, titlesPath, redirectsPath):
+    """
+    Builds the index from a dump of the article titles (enwiki-latest-all-titles-in-ns0, one title per line)
+    and a tab separated file of redirects (source title, target title), both possibly gzipped.
+    The redirects are required: without them names would resolve to the titles of redirect pages instead of their articles.
+    """
+    buildIndex(path, _dumpPairs(titlesPath, redirectsPath))
+
+
+class WikipediaIndex:
+    """
+    Looks names up in an index built by buildWikipediaIndex. Names are matched case-folded, redirects are followed,
+    and names with no match are compared to the nearby and same-prefix titles to allow for small spelling differences.
+    An index built without the redirects is refused (ValueError).
+    """
+
+    def __init__(self, path, cutoff = 0.85, candidates = 200):
+        self._index = SortedIndex(path)
+        if len(self._index.get(REDIRECTS_MARKER)) == 0:
+            self._index.close()
+            raise ValueError("%s was built without the redirects, rebuild it with wikiindex.py" % path)
+        self._cutoff = cutoff
+        self._candidates = candidates
+
+    def _match(self, key, name):
+        """returns the article title for an index key, preferring the title written as name"""
+        articles = {}
+        originals = []
+        for value in self._index.get(key):
+            (original, article) = value.split("\t", 1)
+            if not original in articles:
+                originals.append(original)
+            # a redirect overrides the line of the redirect page itself
+            if not original == article:
+                articles[original] = article
+            else:
+                articles.setdefault(original, article)
+        if len(originals) == 0:
+            return None
+        name = re.sub(r"\s+", " ", name).strip()
+        if name in articles:
+            return articles[name]
+        return articles[originals[0]]
+
+    def lookup(self, name):
+        """returns the title of the article best matching a name, or None"""
+        key = foldTitle(name)
+        if key == "":
+            return None
+        match = self._match(key, name)
+        if match == None:
+            keys = set([candidate for (candidate, value) in self._index.scan(key, self._candidates)])
+            keys.update([candidate for (candidate, value) in self._index.prefix(key[:3], self._candidates)])
+            close = difflib.get_close_matches(key, keys, 1, self._cutoff)
+            if len(close) > 0:
+                match = self._match(close[0], name)
+        return match
+
+    def close(self):
+        self._index.close()
+
+
+def main(argv):
+    parser = OptionParser(usage = "usage: %prog titles-dump redirects-file index-file\n\nredirects-file is tab separated (source title, target title)")
+    (options, args) = parser.parse_args(argv)
+    if not len(args) == 3:
+        parser.error("a titles dump, a redirects file and an index file must be given")
+    buildWikipediaIndex(args[2], args[0], args[1])
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,146 @@
+'''
+Web 2.0 & Mobile Interaction -- Final Project
+December 4, 2009
+
+Olivier Jais-Nielsen (s090763)
+Andrea Lai (s091088)
+
+The Enhanced Feed Reader uses latent semantic analysis to identify people, organizations, and places within an RSS feed and pull in relevant additional content (Google Maps, Google Search, and recent tweets) for display.
+
+
+workers.py provides a small pool of worker threads fed by a bounded queue
+'''
+
+import sys
+import threading
+import traceback
+import Queue
+
+
+class Task:
+    """A function call run by a worker pool. Its result (or exception) can be waited for."""
+
+    def __init__(self, function, args):
+        self._function = function
+        self._args = args
+        self._result = None
+        self._error = None
+        self._done = threading.Event()
+
+    def run(self):
+        try:
+            self._result = self._function(*self._args)
+        except:
+            self._error = sys.exc_info()
+        self._done.set()
+
+    def done(self):
+        return self._done.isSet()
+
+    def result(self, timeout = None):
+        """waits for the call to finish and returns its result, raising its exception if it failed"""
+        self._done.wait(timeout)
+        if not self._error == None:
+            raise self._error[0], self._error[1], self._error[2]
+        return self._result
+
+
+class WorkerPool:
+    """A fixed number of daemon threads running the tasks of a queue. With a bounded queue, submit blocks while the pool is saturated."""
+
+    def __init__(self, workers, queueSize = 0, name = "worker", logErrors = False):
+        self._queue = Queue.Queue(queueSize)
+        self._logErrors = logErrors
+        for i in range(workers):
+            thread = threading.Thread(target = self._run, name = "%s-%d" % (name, i))
+            thread.setDaemon(True)
+            thread.start()
+
+    def _run(self):
+        while True:
+            task = self._queue.get()
+            task.run()
+            if self._logErrors and not task._error == None:
+                traceback.print_exception(*task._error)
+            self._queue.task_done()
+
+    def submit(self, function, *args):
+        task = Task(function, args)
+        self._queue.put(task)
+        return task
+
+    def map(self, function, inputs):
+        """runs function on every input concurrently and returns the results in order"""
+        tasks = [self.submit(function, input) for input in inputs]
+        return [task.result() for task in tasks]
+
+    def join(self):
+        """waits until every submitted task is done"""
+        self._queue.join()
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time: callers asking for a key that is already being computed
+    wait for that call and share its result (or exception) instead of making their own.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.deduplicated = 0
+
+    def do(self, key, function, *args):
+        self._lock.acquire()
+        task = self._calls.get(key)
+        leader = task == None
+        if leader:
+            task = Task(function, args)
+            self._calls[key] = task
+            self.calls += 1
+        else:
+            self.deduplicated += 1
+        self._lock.release()
+        if leader:
+            task.run()
+            self._lock.acquire()
+            del self._calls[key]
+            self._lock.release()
+        return task.result()
+
+    def doMany(self, keys, function):
+        """
+        Like do for several keys at once: function is called once with the list of the keys nobody is computing,
+        and returns the list of their results. Returns the results of all the keys, in order.
+        """
+        self._lock.acquire()
+        tasks = []
+        led = []
+        for key in keys:
+            task = self._calls.get(key)
+            if task == None:
+                # the result of the key in the batch
+                task = Task(lambda index: batch.result()[index], (len(led),))
+                self._calls[key] = task
+                led.append((key, task))
+            elif not (key, task) in led:
+                self.deduplicated += 1
+            tasks.append(task)
+        if len(led) > 0:
+            self.calls += 1
+        batch = Task(function, ([key for (key, task) in led],))
+        self._lock.release()
+        if len(led) > 0:
+            batch.run()
+            for (key, task) in led:
+                task.run()
+            self._lock.acquire()
+            for (key, task) in led:
+                del self._calls[key]
+            self._lock.release()
+        return [task.result() for task in tasks]
+
+    def stats(self):
+        """returns the number of calls made and of calls saved by waiting for another one"""
+        return {"calls": self.calls, "deduplicated": self.deduplicated}